@@ -22,9 +22,16 @@
 
 import os
 
-from smolagents import CodeAgent, InferenceClientModel
+from smolagents import CodeAgent
 
-from other_tools import ImageQueryTool
+from budget import get_default_governor
+from condense import get_default_condenser
+from knowledge_store import get_default_store
+from other_tools import ImageQueryTool, LocalSearchTool, ParallelMapTool
+from plans import get_default_plan_library
+from profiling import get_default_run_profiler
+from providers import get_default_provider_manager
+from resilience import ResilientInferenceClientModel
 from web_tools import TavilyBaseClient, TavilySearchTool, TavilyExtractTool, TavilyImageURLSearchTool
 
 class SmolAlbert(CodeAgent):
@@ -38,24 +45,53 @@ class SmolAlbert(CodeAgent):
     #model_id = "google/gemma-3-27b-it"
     provider = "auto"
 
-    def __init__(self):
+    def __init__(self, session_id: str | None = None):
         """
         Initialize the SmolAlbert agent with Tavily tools and a model.
+        The Tavily credits spent by the agent are governed and accounted to the given session.
         """
+        self.session_id = session_id or "default"
+        self.governor = get_default_governor()
+        self.plan_library = get_default_plan_library()
+        # plan of the last run hint, if any
+        self.last_plan = None
+
         # Set up the agent with the Tavily tool and a model
-        self.search_tool = TavilySearchTool()
+        # (fetched contents are indexed in a local store shared by all agents, searchable for free)
+        knowledge_store = get_default_store()
+        self.local_search_tool = LocalSearchTool(knowledge_store)
+        self.search_tool = TavilySearchTool(knowledge_store)
         self.image_search_tool = TavilyImageURLSearchTool()
-        self.extract_tool = TavilyExtractTool()
+        # (large extracted pages are condensed for the task by a small model before reaching the agent)
+        self.extract_tool = TavilyExtractTool(knowledge_store, get_default_condenser())
         self.image_query_tool = ImageQueryTool()
-        model = InferenceClientModel(
+        for tool in (self.search_tool, self.image_search_tool, self.extract_tool):
+            tool.attach_governor(self.governor, self.session_id)
+        self.parallel_map_tool = ParallelMapTool(
+            [self.local_search_tool, self.search_tool, self.image_search_tool, self.extract_tool, self.image_query_tool])
+        model = ResilientInferenceClientModel(
             model_id=self.model_id,
             provider=self.provider,
+            provider_manager=get_default_provider_manager() if self.provider == "auto" else None,
+            # the agent model is on the critical path of every run, a slow generation is worth a duplicate
+            hedge=True,
             token=os.getenv("HF_API_KEY"))
         self.agent = CodeAgent(
-            tools=[self.search_tool, self.image_search_tool, self.extract_tool, self.image_query_tool], 
+            tools=[
+                self.local_search_tool,
+                self.search_tool,
+                self.image_search_tool,
+                self.extract_tool,
+                self.image_query_tool,
+                self.parallel_map_tool
+            ],
             model=model,
             stream_outputs=True,
             instructions=(
+                "Before spending Tavily credits, try local_search: it is free. Only call tavily_search or "
+                "tavily_extract when local results are missing, irrelevant or too old for the question. "
+                "When several tool calls are independent (e.g. searching several queries or extracting several URLs), "
+                "run them all at once with parallel_map instead of one after another. "
                 "When writing the final answer, including the most relevant URL(s) "
                 "from your search results as inline Markdown hyperlinks is MANDATORY. "
                 "Example format: ... (see [1](https://example1.com)) ... (see [2](https://example2.com)) ... "
@@ -65,6 +101,8 @@ class SmolAlbert(CodeAgent):
         )
 
         self.advanced_mode = False
+        # set to profile the next run regardless of the sampling rate
+        self.profile_next = False
 
     def enable_advanced_mode(self, enable: bool):
         """
@@ -79,13 +117,23 @@ class SmolAlbert(CodeAgent):
         """
         Run the agent with a given query and return the final answer.
         """
-        return self.agent.run(
-            task=task,
+        self.governor.start_run(self.session_id, task)
+        self.extract_tool.set_task(task)
+        force_profile, self.profile_next = self.profile_next, False
+
+        # a prompt of a known shape gets the plan of a previous successful run as a hint
+        self.last_plan = self.plan_library.match(task) if self.plan_library is not None else None
+        hinted_task = f"{task}\n\n{self.plan_library.hint(self.last_plan, task)}" if self.last_plan else task
+        stream = self.agent.run(
+            task=hinted_task,
             stream=True,
             reset=False,
             max_steps=5,
             additional_args=additional_args
         )
+        if self.plan_library is not None:
+            stream = self.plan_library.track(stream, task, self.last_plan)
+        return get_default_run_profiler().profile_stream(stream, label=self.session_id, force=force_profile)
         
     def reset(self):
         """
@@ -93,6 +141,33 @@ class SmolAlbert(CodeAgent):
         """
         self.agent.memory.reset()
 
+    def get_memory_steps(self) -> list:
+        """
+        Get the agent's memory steps (e.g. to persist them).
+        """
+        return list(self.agent.memory.steps)
+
+    def set_memory_steps(self, steps: list):
+        """
+        Replace the agent's memory steps (e.g. when restoring a persisted session).
+        """
+        self.agent.memory.steps = list(steps)
+
+    def get_spent_credits(self) -> int:
+        """
+        Get the Tavily credits spent by this agent's tools so far.
+        """
+        return sum(
+            tool.credits_used
+            for tool in (self.search_tool, self.image_search_tool, self.extract_tool)
+        )
+
+    def get_budget_report(self) -> str:
+        """
+        Get the Tavily credits spent by this agent's session and globally over the budget window.
+        """
+        return self.governor.report(self.session_id)
+
     @staticmethod
     def get_search_credits() -> str:
         """
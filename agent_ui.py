@@ -34,14 +34,18 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import hmac
 import re
 from typing import Generator
 
+import gradio as gr
 from smolagents.agent_types import AgentAudio, AgentImage, AgentText
 from smolagents.agents import MultiStepAgent, PlanningStep
 from smolagents.memory import ActionStep, FinalAnswerStep
 from smolagents.models import ChatMessageStreamDelta, MessageRole, agglomerate_stream_deltas
 
+from profiling import PHASES, get_default_run_profiler
+
 FINAL_ANSWER_TAG = "Final answer:"
 
 def get_step_footnote_content(step_log: ActionStep | PlanningStep, step_name: str) -> str:
@@ -95,6 +99,52 @@ def _format_code_content(content: str) -> str:
     return content
 
 
+def _extract_streamed_final_answer(model_output: str) -> str | None:
+    """
+    Extract the final answer from a model output being streamed, as soon as it starts writing a
+    `final_answer("...")` call with a string literal.
+
+    Args:
+        model_output (`str`): Model output streamed so far.
+
+    Returns:
+        `str | None`: The (possibly partial) final answer, or None if no final answer literal is being streamed.
+    """
+    matches = list(re.finditer(r"final_answer\(\s*(?:answer\s*=\s*)?([rRuU]?)(\"\"\"|'''|\"|')", model_output))
+    if not matches:
+        return None
+    match = matches[-1]
+    is_raw = match.group(1) in ("r", "R")
+    quote = match.group(2)
+
+    # read the literal up to its closing quote (if already streamed), skipping escaped characters
+    body = model_output[match.end():]
+    end = 0
+    while end < len(body) and not body.startswith(quote, end):
+        end += 2 if body[end] == "\\" else 1
+    answer = body[:end]
+
+    if not is_raw:
+        escapes = {"n": "\n", "t": "\t"}
+        answer = re.sub(r"\\(.)", lambda m: escapes.get(m.group(1), m.group(1)), answer, flags=re.DOTALL)
+    return answer
+
+
+def _close_markdown(markdown: str) -> str:
+    """
+    Close the code block left open by a partial markdown text, so that it renders properly while streamed.
+
+    Args:
+        markdown (`str`): Partial markdown text.
+
+    Returns:
+        `str`: Markdown text with its last code block closed.
+    """
+    if markdown.count("```") % 2:
+        markdown += "\n```"
+    return markdown
+
+
 def _process_action_step(step_log: ActionStep, skip_model_outputs: bool = False) -> Generator:
     """
     Process an [`ActionStep`] and yield appropriate Gradio ChatMessage objects.
@@ -293,24 +343,59 @@ class AgentUI:
 
     Args:
         agent ([`MultiStepAgent`]): The agent to interact with.
+        session_manager ([`SessionManager`], *optional*): When given, each browser session gets its own agent
+            from the manager (which hibernates idle sessions), and `agent` is only used for session-less calls.
+        admin_token (`str`, *optional*): When given, the profiling panel is shown to the users opening the app
+            with `?admin=<admin_token>`.
     """
 
-    def __init__(self, agent: MultiStepAgent):
+    def __init__(self, agent: MultiStepAgent, session_manager=None, admin_token: str | None = None):
         self.agent = agent
+        self.session_manager = session_manager
+        self.admin_token = admin_token
         self.description = getattr(agent, "description", None)
 
-    def set_advanced_mode(self, enabled: bool):
+    def _get_agent(self, request: gr.Request | None):
+        """
+        Return the agent serving the given request: the session's agent if sessions are managed, the shared one otherwise.
+        """
+        if self.session_manager is not None and request is not None and request.session_hash:
+            return self.session_manager.get(request.session_hash).agent
+        return self.agent
+
+    def set_advanced_mode(self, enabled: bool, request: gr.Request | None = None):
         """
         Configure the agent to enable/disable advanced mode.
         """
-        self.agent.enable_advanced_mode(enabled)
+        self._get_agent(request).enable_advanced_mode(enabled)
 
-    def interact_with_agent(self, prompt: str, verbose_messages: list, quiet_messages: list):
+    def interact_with_agent(self, prompt: str, verbose_messages: list, quiet_messages: list, request: gr.Request | None = None):
         """
         Interacts with the agent and streams results into two separate histories:
             - verbose_messages: full reasoning stream (Chatterbox)
             - quiet_messages: only user prompt + final answer (Quiet)
-        Quiet is enhanced with pending "Step N..." indicators only (no generic thinking text).
+        Quiet is enhanced with pending "Step N..." indicators only (no generic thinking text), and the final answer
+        is streamed into Quiet as soon as the model starts writing it, then replaced by the actual final answer.
+        When sessions are managed, the session's agent is used and histories evicted from the UI state are rehydrated.
+        """
+        if self.session_manager is None or request is None or not request.session_hash:
+            yield from self._interact(self.agent, prompt, verbose_messages, quiet_messages)
+            return
+
+        with self.session_manager.use(request.session_hash) as session:
+            # UI states may have expired while the session was hibernated, fall back to the stored histories
+            if not verbose_messages and not quiet_messages:
+                verbose_messages = session.verbose_messages
+                quiet_messages = session.quiet_messages
+            try:
+                yield from self._interact(session.agent, prompt, verbose_messages, quiet_messages)
+            finally:
+                session.verbose_messages = verbose_messages
+                session.quiet_messages = quiet_messages
+
+    def _interact(self, agent, prompt: str, verbose_messages: list, quiet_messages: list):
+        """
+        Stream the run of the given agent into the verbose and quiet histories (see interact_with_agent).
         """
         import gradio as gr
 
@@ -324,8 +409,10 @@ class AgentUI:
             yield verbose_messages, quiet_messages
 
             quiet_pending_idx = None
+            quiet_pending_text = None
+            streaming_answer = False
 
-            for msg in stream_to_gradio(self.agent, task=prompt):
+            for msg in stream_to_gradio(agent, task=prompt):
 
                 # Full gr.ChatMessage object (from steps) — append to verbose always
                 if isinstance(msg, gr.ChatMessage):
@@ -360,6 +447,7 @@ class AgentUI:
                         if match:
                             step_num = match.group(1)
                             pending_text = f"⏳ Step {step_num}..."
+                            quiet_pending_text = pending_text
                             if quiet_pending_idx is None:
                                 quiet_messages.append(
                                     gr.ChatMessage(
@@ -369,10 +457,26 @@ class AgentUI:
                                     )
                                 )
                                 quiet_pending_idx = len(quiet_messages) - 1
-                            else:
+                            elif not streaming_answer:
+                                # keep showing the streamed final answer until the actual one replaces it
                                 quiet_messages[quiet_pending_idx].content = pending_text
 
                 elif isinstance(msg, str):
+                    # stream the final answer into quiet as soon as the model starts writing its final_answer call
+                    streamed_answer = _extract_streamed_final_answer(msg)
+                    if streamed_answer:
+                        streaming_answer = True
+                        if quiet_pending_idx is None:
+                            quiet_messages.append(
+                                gr.ChatMessage(role=MessageRole.ASSISTANT, content="", metadata={"status": "pending"})
+                            )
+                            quiet_pending_idx = len(quiet_messages) - 1
+                        quiet_messages[quiet_pending_idx].content = _close_markdown(streamed_answer)
+                    elif streaming_answer and streamed_answer is None:
+                        # the final answer was not submitted (e.g. the step failed), a new step is being streamed
+                        streaming_answer = False
+                        quiet_messages[quiet_pending_idx].content = quiet_pending_text or ""
+
                     text = msg.replace("<", r"\<").replace(">", r"\>")
                     if verbose_messages and verbose_messages[-1].metadata.get("status") == "pending":
                         verbose_messages[-1].content = text
@@ -390,11 +494,14 @@ class AgentUI:
             yield verbose_messages, quiet_messages
             raise gr.Error(f"Error in interaction: {str(e)}")
 
-    def clear_history(self):
+    def clear_history(self, request: gr.Request | None = None):
         """
         Clear the chat history and reset the agent's memory.
         """
-        self.agent.reset()
+        if self.session_manager is not None and request is not None and request.session_hash:
+            self.session_manager.reset(request.session_hash)
+        else:
+            self.agent.reset()
         return [], []
 
     def disable_query(self, text_input):
@@ -443,11 +550,60 @@ class AgentUI:
         """
         return self.agent.get_search_credits()
 
-    def get_advanced_mode(self) -> bool:
+    def get_budget_report(self, request: gr.Request | None = None) -> str:
+        """
+        Fetch the Tavily credits spent by the session and globally over the budget window.
+        """
+        agent = self._get_agent(request)
+        return agent.get_budget_report() if hasattr(agent, "get_budget_report") else ""
+
+    def get_advanced_mode(self, request: gr.Request | None = None) -> bool:
         """
         Return the agent's current advanced_mode flag for initializing the checkbox on page load.
         """
-        return getattr(self.agent, "advanced_mode", False)
+        return getattr(self._get_agent(request), "advanced_mode", False)
+
+    def _is_admin(self, request: gr.Request | None) -> bool:
+        if not self.admin_token or request is None:
+            return False
+        return hmac.compare_digest(request.query_params.get("admin", ""), self.admin_token)
+
+    def show_profiling_panel(self, request: gr.Request | None = None):
+        """
+        Show the profiling panel to admins only, on page load.
+        """
+        return gr.Accordion(visible=self._is_admin(request))
+
+    def profile_next_request(self, request: gr.Request | None = None) -> str:
+        """
+        Profile the next run of the admin's own session.
+        """
+        if not self._is_admin(request):
+            return ""
+        self._get_agent(request).profile_next = True
+        return "Your next request will be profiled."
+
+    def set_profile_rate(self, rate: float, request: gr.Request | None = None):
+        """
+        Set the share of all the runs that get profiled.
+        """
+        if self._is_admin(request):
+            get_default_run_profiler().sample_rate = rate
+
+    def get_profiles(self, request: gr.Request | None = None):
+        """
+        Return the per-phase breakdown of the latest profiles and their collapsed stacks files.
+        """
+        if not self._is_admin(request):
+            return [], None
+        profiles = get_default_run_profiler().recent()
+        rows = []
+        for profile in profiles:
+            summary = profile.summary()
+            shares = [f"{summary['phases'].get(phase, {}).get('share', 0.0):.0%}" for phase in PHASES]
+            rows.append([summary["started_at"], profile.label, summary["duration_s"], *shares])
+        files = [profile.path for profile in profiles if profile.path is not None]
+        return rows, files or None
 
     def create_app(self):
         import gradio as gr
@@ -456,9 +612,11 @@ class AgentUI:
         with gr.Blocks(theme="JohnSmith9982/small_and_pretty", fill_height=True) as agent:
 
             # Set up states to hold the session information
-            stored_query = gr.State("")             # current user query
-            stored_messages_verbose = gr.State([])  # full reasoning history
-            stored_messages_quiet = gr.State([])    # only user + final answer
+            # (when sessions are managed, histories are also kept by the session and may expire from the UI state)
+            state_ttl = self.session_manager.idle_timeout if self.session_manager is not None else None
+            stored_query = gr.State("")                                     # current user query
+            stored_messages_verbose = gr.State([], time_to_live=state_ttl)  # full reasoning history
+            stored_messages_quiet = gr.State([], time_to_live=state_ttl)    # only user + final answer
 
             with gr.Sidebar():
                 gr.Markdown(
@@ -495,6 +653,36 @@ class AgentUI:
                     container=True,
                 )
 
+                budget_report = gr.Textbox(
+                    label="Credits spent (budget window)",
+                    interactive=False,
+                    container=True,
+                )
+                agent.load(self.get_budget_report, None, budget_report)
+
+                # admin-only profiling of agent runs (collapsed stacks open in speedscope or flamegraph.pl)
+                with gr.Accordion("Profiling", open=False, visible=False) as profiling_panel:
+                    profile_rate = gr.Slider(
+                        0.0, 1.0,
+                        value=get_default_run_profiler().sample_rate,
+                        step=0.01,
+                        label="Share of all requests profiled",
+                    )
+                    profile_next_btn = gr.Button("Profile my next request")
+                    profile_status = gr.Markdown()
+                    profiles_table = gr.Dataframe(
+                        headers=["started", "session", "duration (s)", *PHASES],
+                        label="Latest profiles (share of samples per phase)",
+                        interactive=False,
+                    )
+                    profile_files = gr.File(label="Collapsed stacks", file_count="multiple")
+                    refresh_profiles_btn = gr.Button("Refresh")
+
+                agent.load(self.show_profiling_panel, None, profiling_panel)
+                profile_rate.release(self.set_profile_rate, profile_rate, None)
+                profile_next_btn.click(self.profile_next_request, None, profile_status)
+                refresh_profiles_btn.click(self.get_profiles, None, [profiles_table, profile_files])
+
                 gr.HTML(
                     "<br><br><h4><center>Powered by <a target='_blank' href='https://github.com/huggingface/smolagents'><b>smolagents</b></a></center></h4>"
                 )
@@ -550,6 +738,10 @@ class AgentUI:
                 self.get_tavily_credits,
                 None,
                 tavily_credits,
+            ).then(
+                self.get_budget_report,
+                None,
+                budget_report,
             ).then(
                 self.enable_query,
                 None,
@@ -568,6 +760,10 @@ class AgentUI:
                 self.get_tavily_credits,
                 None,
                 tavily_credits,
+            ).then(
+                self.get_budget_report,
+                None,
+                budget_report,
             ).then(
                 self.enable_query,
                 None,
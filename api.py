@@ -0,0 +1,168 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+from contextlib import ExitStack
+from typing import Generator
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from smolagents.agent_types import AgentType
+from smolagents.agents import PlanningStep
+from smolagents.memory import ActionStep, FinalAnswerStep
+from smolagents.models import ChatMessageStreamDelta
+
+from budget import get_default_governor
+from condense import get_default_condenser
+from providers import get_default_provider_manager
+from resilience import get_endpoint_stats
+from sessions import SessionBusy, SessionManager
+from worker_pool import WorkerPool
+
+def _step_payload(step: ActionStep | PlanningStep) -> dict:
+    """
+    Build the JSON payload of a memory step event.
+    """
+    payload = {
+        "duration": step.timing.duration,
+        "input_tokens": step.token_usage.input_tokens if step.token_usage is not None else None,
+        "output_tokens": step.token_usage.output_tokens if step.token_usage is not None else None,
+    }
+    if isinstance(step, ActionStep):
+        payload.update({
+            "step_number": step.step_number,
+            "code": step.code_action,
+            "observations": step.observations,
+            "error": str(step.error) if step.error is not None else None,
+            "is_final_answer": step.is_final_answer,
+        })
+    else:
+        payload["plan"] = step.plan
+    return payload
+
+def stream_events(agent, task: str, additional_args: dict | None = None) -> Generator[tuple[str, dict], None, None]:
+    """
+    Run an agent with the given task and yield typed (event_type, payload) events.
+    Events are built from the same agent events stream_to_gradio consumes, but each one only carries new data:
+        - "delta": a chunk of the model output being streamed
+        - "action_step" / "planning_step": a completed memory step
+        - "final_answer": the final answer of the run
+    """
+    for event in agent.run(task, additional_args=additional_args):
+        if isinstance(event, ChatMessageStreamDelta):
+            if event.content:
+                yield "delta", {"content": event.content}
+        elif isinstance(event, ActionStep):
+            yield "action_step", _step_payload(event)
+        elif isinstance(event, PlanningStep):
+            yield "planning_step", _step_payload(event)
+        elif isinstance(event, FinalAnswerStep):
+            output = event.output
+            yield "final_answer", {"output": output.to_string() if isinstance(output, AgentType) else output}
+
+def _format_sse(event_type: str, payload: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+class RunRequest(BaseModel):
+    task: str
+    advanced_mode: bool | None = None
+    profile: bool = False
+
+def create_api(session_manager: SessionManager, worker_pool: WorkerPool | None = None) -> FastAPI:
+    """
+    Create the programmatic HTTP API, serving the sessions of the given manager:
+        - POST /v1/sessions/{session_id}/run: run a task and return the final answer with all steps
+        - POST /v1/sessions/{session_id}/stream: run a task and stream its events as server-sent events
+        - POST /v1/sessions/{session_id}/reset: reset the session
+        - GET /v1/stats: latency and health of the outbound endpoints and inference providers, extract condensation savings,
+          Tavily credits spent by each session over the budget window
+    When agents run in a worker pool, the stats of each worker are reported under "workers".
+    """
+    api = FastAPI(title="SmolAlbert API")
+
+    def acquire(session_id: str, request: RunRequest, stack: ExitStack):
+        """
+        Mark the session as busy until the stack is closed and return it, or fail if it is already running.
+        """
+        try:
+            session = stack.enter_context(session_manager.use(session_id, exclusive=True))
+        except SessionBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if request.advanced_mode is not None:
+            session.agent.enable_advanced_mode(request.advanced_mode)
+        if request.profile:
+            session.agent.profile_next = True
+        return session
+
+    # endpoints are synchronous on purpose: agent runs are blocking and get executed in the server threadpool
+    @api.post("/v1/sessions/{session_id}/run")
+    def run(session_id: str, request: RunRequest):
+        with ExitStack() as stack:
+            session = acquire(session_id, request, stack)
+            steps = []
+            answer = None
+            try:
+                for event_type, payload in stream_events(session.agent, request.task):
+                    if event_type == "final_answer":
+                        answer = payload["output"]
+                    elif event_type != "delta":
+                        steps.append({"type": event_type, **payload})
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error in interaction: {e}")
+        return {"answer": answer, "steps": steps}
+
+    @api.post("/v1/sessions/{session_id}/stream")
+    def stream(session_id: str, request: RunRequest):
+        with ExitStack() as stack:
+            session = acquire(session_id, request, stack)
+            # the session is released by the stream once it is over
+            release = stack.pop_all()
+
+        def sse():
+            with release:
+                try:
+                    for event_type, payload in stream_events(session.agent, request.task):
+                        yield _format_sse(event_type, payload)
+                except Exception as e:
+                    yield _format_sse("error", {"message": str(e)})
+
+        return StreamingResponse(sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @api.post("/v1/sessions/{session_id}/reset")
+    def reset(session_id: str):
+        session_manager.reset(session_id)
+        return {"status": "ok"}
+
+    @api.get("/v1/stats")
+    def stats():
+        condenser = get_default_condenser()
+        governor = get_default_governor()
+        return {
+            "endpoints": get_endpoint_stats(),
+            "providers": get_default_provider_manager().stats(),
+            "condensation": condenser.stats if condenser is not None else None,
+            "workers": worker_pool.worker_stats() if worker_pool is not None else None,
+            "budget": {"report": governor.report(), "sessions": governor.session_spends()},
+        }
+
+    return api
@@ -20,10 +20,119 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import argparse
+import functools
+import os
+import threading
+
 from agent import SmolAlbert
 from agent_ui import AgentUI
+from budget import BudgetGovernor, get_default_governor, set_default_governor
+from condense import DEFAULT_MODEL_ID as CONDENSE_MODEL_ID, Condenser, set_default_condenser
+from plans import PlanLibrary, set_default_plan_library
+from profiling import RunProfiler, set_default_run_profiler
+from providers import get_default_provider_manager
+from sessions import SessionManager, SessionStore
+from worker_pool import RemoteAgent, WorkerPool
+
+def warm_up_providers(benchmark: bool, condense: bool):
+    """
+    Resolve the inference providers and open the connections in the background, before the first user request
+    (the condensation model only when condensation is enabled).
+    """
+    provider_manager = get_default_provider_manager()
+    model_ids = [SmolAlbert.model_id, "google/gemma-3-27b-it"] + ([CONDENSE_MODEL_ID] if condense else [])
+    for model_id in model_ids:
+        threading.Thread(target=provider_manager.warm_up, args=(model_id, benchmark), daemon=True).start()
+
+def configure_condensation(threshold: int, workers: int):
+    """
+    Configure the condensation of large extracted pages (a threshold of 0 leaves it disabled).
+    """
+    set_default_condenser(Condenser(threshold_chars=threshold, max_workers=workers) if threshold > 0 else None)
+
+def configure_worker(args: argparse.Namespace):
+    """
+    Set up a worker process like the server process (the budget governor is shared by the pool).
+    The server process samples the runs to profile and ranks the providers, workers only follow.
+    """
+    set_default_run_profiler(RunProfiler(sample_rate=0.0, output_dir=args.profile_dir))
+    if args.plan_library:
+        set_default_plan_library(PlanLibrary(args.plan_library))
+    configure_condensation(args.condense_threshold, args.condense_workers)
 
 if __name__ == "__main__":
-    agent = SmolAlbert()
-    agent_ui = AgentUI(agent)
-    agent_ui.launch(share=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the SmolAlbert web app.")
+    parser.add_argument("--api", action="store_true", help="also serve the HTTP API (/v1/sessions/...) next to the Gradio UI")
+    parser.add_argument("--port", type=int, default=7860, help="server port (only used with --api)")
+    parser.add_argument("--global-budget", type=float, default=None, help="Tavily credits all sessions may spend over the budget window")
+    parser.add_argument("--session-budget", type=float, default=None, help="Tavily credits a session may spend over the budget window")
+    parser.add_argument("--budget-window-days", type=float, default=30.0, help="rolling budget window, e.g. the billing period")
+    parser.add_argument("--max-searches", type=int, default=10, help="maximum Tavily searches per request")
+    parser.add_argument("--max-extracts", type=int, default=10, help="maximum Tavily extracts per request")
+    parser.add_argument("--benchmark-providers", action="store_true", help="measure every inference provider at startup and pin the fastest")
+    parser.add_argument("--profile-rate", type=float, default=0.0, help="share of the requests profiled (flamegraphs and per-phase breakdown)")
+    parser.add_argument("--profile-dir", default="profiles", help="directory where profiles are saved")
+    parser.add_argument("--admin-token", default=os.getenv("SMOLALBERT_ADMIN_TOKEN"), help="shows the profiling panel on /?admin=<token>")
+    parser.add_argument("--plan-library", default=None, help="plan library database: reuse the plans of successful runs (e.g. plans.db)")
+    parser.add_argument("--condense-threshold", type=int, default=0, help="condense the extracted pages above this size (characters, e.g. 20000) with a small model, 0 to disable")
+    parser.add_argument("--condense-workers", type=int, default=4, help="maximum concurrent small model calls condensing pages")
+    parser.add_argument("--workers", type=int, default=0, help="run agents in this many worker processes instead of the server process")
+    parser.add_argument("--run-time-limit", type=float, default=600.0, help="maximum duration of a run in a worker (s)")
+    parser.add_argument("--run-cpu-limit", type=float, default=None, help="maximum CPU time of a run in a worker (s)")
+    parser.add_argument("--worker-memory-mb", type=int, default=None, help="maximum address space of a worker process (MiB)")
+    parser.add_argument("--worker-max-runs", type=int, default=50, help="runs after which a worker process is replaced")
+    args = parser.parse_args()
+
+    set_default_governor(BudgetGovernor(
+        global_limit=args.global_budget,
+        session_limit=args.session_budget,
+        window=args.budget_window_days * 24 * 3600,
+        max_searches_per_run=args.max_searches,
+        max_extracts_per_run=args.max_extracts,
+        path="budget.db",
+    ))
+
+    set_default_run_profiler(RunProfiler(sample_rate=args.profile_rate, output_dir=args.profile_dir))
+    if args.plan_library:
+        set_default_plan_library(PlanLibrary(args.plan_library))
+    configure_condensation(args.condense_threshold, args.condense_workers)
+
+    worker_pool = None
+    agent_factory = SmolAlbert
+    if args.workers > 0:
+        # model-generated code and CPU-heavy work cannot stall the streaming of the server process
+        worker_pool = WorkerPool(
+            SmolAlbert,
+            size=args.workers,
+            time_limit=args.run_time_limit,
+            cpu_limit=args.run_cpu_limit,
+            memory_limit=args.worker_memory_mb * 2**20 if args.worker_memory_mb else None,
+            max_runs_per_worker=args.worker_max_runs,
+            initializer=functools.partial(configure_worker, args),
+        )
+        agent_factory = functools.partial(RemoteAgent, worker_pool)
+    # providers are ranked once, in the server process, and the ranking is shipped to the workers with each run
+    warm_up_providers(args.benchmark_providers, args.condense_threshold > 0)
+
+    agent = agent_factory()
+    # one agent per browser session, idle sessions are hibernated to disk and survive restarts
+    session_manager = SessionManager(
+        agent_factory=agent_factory, store=SessionStore("sessions.db"), governor=get_default_governor())
+    agent_ui = AgentUI(agent, session_manager=session_manager, admin_token=args.admin_token)
+    try:
+        if args.api:
+            import gradio as gr
+            import uvicorn
+
+            from api import create_api
+
+            # API and UI share the same sessions
+            app = gr.mount_gradio_app(create_api(session_manager, worker_pool), agent_ui.create_app(), path="/")
+            uvicorn.run(app, host="127.0.0.1", port=args.port)
+        else:
+            agent_ui.launch(share=False)
+    finally:
+        session_manager.close()
+        if worker_pool is not None:
+            worker_pool.close()
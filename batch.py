@@ -0,0 +1,243 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Headless batch runner: runs a JSONL corpus of prompts through SmolAlbert and streams results to JSONL.
+
+Input lines are JSON objects with a "prompt" field and an optional "id" field.
+Output lines hold the answer and per-prompt metrics (steps, tokens, credits, latency).
+The output file doubles as the checkpoint: re-running the same command resumes a killed job
+without redoing the prompts already answered.
+
+With --plan-library, successful runs are recorded as plans and prompts of a known shape are hinted with
+them; results then tell which plan each prompt was hinted with, and the summary compares steps and tokens.
+
+Usage:
+    python batch.py prompts.jsonl results.jsonl --workers 4
+    python batch.py prompts.jsonl results.jsonl --plan-library plans.db
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from smolagents.memory import ActionStep, FinalAnswerStep, PlanningStep
+
+from agent import SmolAlbert
+from condense import Condenser, set_default_condenser
+from plans import PlanLibrary, set_default_plan_library
+
+def prompt_key(prompt: str) -> str:
+    """
+    Return the deduplication key of a prompt (whitespace and case insensitive).
+    """
+    normalized = " ".join(prompt.split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+def load_prompts(path: str) -> list[dict]:
+    """
+    Load the prompts of a JSONL file, giving an id to the ones that have none.
+    """
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            prompts.append({
+                "id": str(record.get("id", line_number)),
+                "prompt": record["prompt"],
+            })
+    return prompts
+
+def load_checkpoint(path: str) -> set[str]:
+    """
+    Return the keys of the prompts already answered successfully in an existing results file.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # last line may be truncated if the job was killed while writing
+                continue
+            if record.get("error") is None:
+                done.add(record["key"])
+    return done
+
+class BatchRunner:
+    """
+    Runs prompts on a pool of workers, each worker owning an isolated agent.
+    """
+
+    def __init__(self, agent_factory=SmolAlbert, workers: int = 4, advanced_mode: bool = False):
+        """
+        Construct the BatchRunner.
+        """
+        self.agent_factory = agent_factory
+        self.workers = workers
+        self.advanced_mode = advanced_mode
+        self._local = threading.local()
+
+    def _get_agent(self):
+        """
+        Return the agent of the current worker thread, creating it on first use.
+        """
+        agent = getattr(self._local, "agent", None)
+        if agent is None:
+            # each worker is accounted as a session of its own
+            agent = self.agent_factory(f"batch-{threading.current_thread().name}")
+            agent.enable_advanced_mode(self.advanced_mode)
+            self._local.agent = agent
+        return agent
+
+    def run_prompt(self, prompt: str) -> dict:
+        """
+        Run a single prompt on a fresh agent context and return its answer and metrics.
+        """
+        agent = self._get_agent()
+        agent.reset()
+        credits_before = agent.get_spent_credits()
+        start_time = time.perf_counter()
+
+        answer = None
+        error = None
+        try:
+            for event in agent.run(prompt):
+                if isinstance(event, FinalAnswerStep):
+                    answer = event.output
+        except Exception as e:
+            error = str(e)
+
+        steps = 0
+        input_tokens = 0
+        output_tokens = 0
+        for step in agent.get_memory_steps():
+            if isinstance(step, ActionStep):
+                steps += 1
+            if isinstance(step, ActionStep | PlanningStep):
+                if step.token_usage is not None:
+                    input_tokens += step.token_usage.input_tokens
+                    output_tokens += step.token_usage.output_tokens
+
+        if error is None and answer is None:
+            error = "no final answer"
+
+        plan = getattr(agent, "last_plan", None)
+        return {
+            "answer": str(answer) if answer is not None else None,
+            "error": error,
+            "steps": steps,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "credits": agent.get_spent_credits() - credits_before,
+            "latency": round(time.perf_counter() - start_time, 3),
+            "plan": {"id": plan["id"], "similarity": plan["similarity"]} if plan is not None else None,
+        }
+
+    def run(self, input_path: str, output_path: str):
+        """
+        Run all the prompts of input_path not yet answered in output_path, appending results as they finish.
+        """
+        prompts = load_prompts(input_path)
+        done = load_checkpoint(output_path)
+
+        # group identical prompts so that each one runs only once
+        groups: dict[str, list[dict]] = {}
+        for record in prompts:
+            groups.setdefault(prompt_key(record["prompt"]), []).append(record)
+        pending = {key: records for key, records in groups.items() if key not in done}
+
+        print(
+            f"{len(prompts)} prompts, {len(groups)} unique, "
+            f"{len(groups) - len(pending)} already done, {len(pending)} to run on {self.workers} worker(s)."
+        )
+
+        completed = 0
+        results = []
+        with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # terminate a line truncated by a killed job, so that new results do not get glued onto it
+            if out.tell() > 0:
+                with open(output_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        out.write("\n")
+            futures = {
+                pool.submit(self.run_prompt, records[0]["prompt"]): key
+                for key, records in pending.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                result = future.result()
+                results.append(result)
+                # results are written from this thread only, one line per (possibly duplicated) input prompt
+                for index, record in enumerate(pending[key]):
+                    line = {"id": record["id"], "key": key, "prompt": record["prompt"], **result}
+                    if index > 0:
+                        line["deduplicated"] = True
+                    out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                out.flush()
+                completed += 1
+                status = "failed" if result["error"] else "done"
+                print(f"[{completed}/{len(pending)}] {key} {status} in {result['latency']}s ({result['steps']} steps, {result['credits']} credits)")
+
+        self._print_summary(results)
+
+    @staticmethod
+    def _print_summary(results: list[dict]):
+        """
+        Print the mean steps and tokens of the successful runs, split by whether they were hinted with a plan.
+        """
+        for name, hinted in (("without plan", False), ("with plan", True)):
+            group = [result for result in results if result["error"] is None and (result["plan"] is not None) == hinted]
+            if group:
+                steps = sum(result["steps"] for result in group) / len(group)
+                tokens = sum(result["input_tokens"] + result["output_tokens"] for result in group) / len(group)
+                print(f"{name:>12}: {len(group)} prompts, {steps:.2f} steps and {tokens:.0f} tokens per prompt")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL corpus of prompts through SmolAlbert.")
+    parser.add_argument("input", help="JSONL file of prompts ({\"id\": ..., \"prompt\": ...} per line)")
+    parser.add_argument("output", help="JSONL results file, also used as checkpoint to resume a job")
+    parser.add_argument("--workers", type=int, default=4, help="number of concurrent agents")
+    parser.add_argument("--advanced", action="store_true", help="enable Tavily advanced mode")
+    parser.add_argument("--plan-library", default=None, help="plan library database: reuse the plans of successful runs")
+    parser.add_argument("--condense-threshold", type=int, default=0, help="condense the extracted pages above this size (characters, e.g. 20000) with a small model, 0 to disable")
+    args = parser.parse_args()
+
+    if args.plan_library:
+        set_default_plan_library(PlanLibrary(args.plan_library))
+    if args.condense_threshold > 0:
+        set_default_condenser(Condenser(threshold_chars=args.condense_threshold))
+
+    BatchRunner(workers=args.workers, advanced_mode=args.advanced).run(args.input, args.output)
+
+if __name__ == "__main__":
+    main()
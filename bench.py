@@ -0,0 +1,383 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Offline benchmarks running against StubAgent (no model or Tavily calls).
+
+Usage:
+    python bench.py api --sessions 8 --runs 3
+    python bench.py parallel --delays 0.5 1.0 0.3 2.0
+    python bench.py resilience --calls 400
+    python bench.py ttfa --runs 5
+    python bench.py isolation --heavy 3
+    python bench.py condense --pages 4
+"""
+
+import argparse
+import functools
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import percentile, start_server
+from stub_agent import StubAgent
+
+def _summary(name: str, latencies: list[float], updates: list[int], elapsed: float, received: list[int] | None = None):
+    runs = len(latencies)
+    line = (
+        f"{name:>8}: {runs / elapsed:6.2f} runs/s | latency mean {statistics.mean(latencies):.2f}s "
+        f"p95 {percentile(latencies, 0.95):.2f}s | {statistics.mean(updates):.0f} updates/run"
+    )
+    if received is not None:
+        line += f" | {statistics.mean(received) / 1024:.1f} KiB/run"
+    print(line)
+
+def bench_api(args):
+    """
+    Compare the throughput of the SSE API against the Gradio event path, with concurrent sessions.
+    """
+    import httpx
+    from gradio_client import Client
+
+    def agent_factory(session_id: str | None = None):
+        return StubAgent(steps=args.steps, token_latency=args.token_latency, tool_latency=args.tool_latency)
+
+    server = start_server(agent_factory, args.port)
+    url = f"http://127.0.0.1:{args.port}"
+
+    def api_session(index: int):
+        latencies, updates, received = [], [], []
+        with httpx.Client(base_url=url, timeout=None) as client:
+            for run in range(args.runs):
+                start_time = time.perf_counter()
+                count, size = 0, 0
+                with client.stream("POST", f"/v1/sessions/bench-{index}/stream", json={"task": f"query {run}"}) as response:
+                    for line in response.iter_lines():
+                        size += len(line) + 1
+                        count += line.startswith("event:")
+                latencies.append(time.perf_counter() - start_time)
+                updates.append(count)
+                received.append(size)
+        return latencies, updates, received
+
+    def gradio_session(index: int):
+        latencies, updates = [], []
+        client = Client(url, verbose=False)
+        for run in range(args.runs):
+            start_time = time.perf_counter()
+            client.predict(f"query {run}", api_name="/disable_query")
+            job = client.submit(api_name="/interact_with_agent")
+            count = sum(1 for _ in job)
+            latencies.append(time.perf_counter() - start_time)
+            updates.append(count)
+        return latencies, updates, None
+
+    try:
+        for name, session in (("api", api_session), ("gradio", gradio_session)):
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                results = list(pool.map(session, range(args.sessions)))
+            elapsed = time.perf_counter() - start_time
+            latencies = [value for result in results for value in result[0]]
+            updates = [value for result in results for value in result[1]]
+            received = [value for result in results for value in result[2]] if results[0][2] is not None else None
+            _summary(name, latencies, updates, elapsed, received)
+    finally:
+        server.should_exit = True
+
+def bench_parallel(args):
+    """
+    Compare sequential tool calls with parallel_map, using stub tools sleeping for the given delays.
+    """
+    from smolagents import Tool
+
+    from other_tools import ParallelMapTool
+
+    class DelayedTool(Tool):
+        name = "delayed"
+        description = "Sleep for the given delay, then return it."
+        inputs = {"delay": {"type": "number", "description": "The delay (seconds)."}}
+        output_type = "number"
+
+        def forward(self, delay: float):
+            time.sleep(delay)
+            return delay
+
+    tool = DelayedTool()
+    calls = [{"tool": "delayed", "args": {"delay": delay}} for delay in args.delays]
+
+    start_time = time.perf_counter()
+    for call in calls:
+        tool(**call["args"])
+    sequential = time.perf_counter() - start_time
+
+    parallel_map = ParallelMapTool([tool], max_workers=args.workers, timeout=args.timeout)
+    start_time = time.perf_counter()
+    results = parallel_map(calls=calls)
+    parallel = time.perf_counter() - start_time
+
+    print(f"sequential: {sequential:.2f}s (sum of delays {sum(args.delays):.2f}s)")
+    print(f"  parallel: {parallel:.2f}s (slowest call {max(args.delays):.2f}s) -> {results}")
+
+def bench_resilience(args):
+    """
+    Measure the tail latency of a stub endpoint with injected latency spikes, called directly then
+    through the resilience layer (hedging), then check that an outage fails fast to cached results.
+    """
+    import random
+
+    from resilience import CircuitOpenError, Endpoint
+
+    rng = random.Random(0)
+    outage = threading.Event()
+
+    def stub_call(query: str):
+        if outage.is_set():
+            time.sleep(args.slow)
+            raise ConnectionError("stub endpoint is down")
+        time.sleep(args.slow if rng.random() < args.spike_rate else args.fast * (0.5 + rng.random()))
+        return {"query": query}
+
+    def measure(call) -> list[float]:
+        latencies = []
+        for index in range(args.calls):
+            start_time = time.perf_counter()
+            call(f"query {index % 20}")
+            latencies.append(time.perf_counter() - start_time)
+        return latencies
+
+    endpoint = Endpoint("stub", timeout=10.0, hedge_percentile=args.hedge_percentile)
+    for name, call in (
+        ("direct", stub_call),
+        ("hedged", lambda query: endpoint.call_with_fallback(query, stub_call, query, hedge=True)),
+    ):
+        latencies = measure(call)
+        print(
+            f"{name:>8}: p50 {percentile(latencies, 0.5) * 1000:.0f}ms | p99 {percentile(latencies, 0.99) * 1000:.0f}ms "
+            f"| mean {statistics.mean(latencies) * 1000:.0f}ms"
+        )
+    print(f"endpoint stats: {endpoint.stats}")
+
+    # outage: the breaker opens after a few slow failures, then calls fail fast to the cached responses
+    outage.set()
+    latencies, fallbacks, errors = [], 0, 0
+    for index in range(40):
+        start_time = time.perf_counter()
+        try:
+            _, requests = endpoint.call_with_fallback(f"query {index % 20}", stub_call, f"query {index % 20}")
+            fallbacks += requests == 0
+        except (CircuitOpenError, ConnectionError):
+            errors += 1
+        latencies.append(time.perf_counter() - start_time)
+    print(
+        f"  outage: breaker {endpoint.breaker.state} | {fallbacks} cached fallbacks, {errors} errors "
+        f"| p50 {percentile(latencies, 0.5) * 1000:.1f}ms"
+    )
+
+def bench_ttfa(args):
+    """
+    Replay stub agent runs through AgentUI and measure, in the Quiet history, the time to the first
+    answer character (streamed final answer) against the time to the complete final answer
+    (which was the time to first answer before final answers were streamed).
+    """
+    from agent_ui import AgentUI
+
+    first_chars, finals = [], []
+    for _ in range(args.runs):
+        agent = StubAgent(steps=args.steps, token_latency=args.token_latency, tool_latency=args.tool_latency)
+        agent_ui = AgentUI(agent)
+        start_time = time.perf_counter()
+        first_char = None
+        for _, quiet_messages in agent_ui.interact_with_agent("query", [], []):
+            last = quiet_messages[-1]
+            content = last.content if isinstance(last.content, str) else ""
+            if last.role == "user" or not content or content.startswith("⏳"):
+                continue
+            if first_char is None:
+                first_char = time.perf_counter() - start_time
+        first_chars.append(first_char)
+        finals.append(time.perf_counter() - start_time)
+
+    print(f"time to first answer character: {statistics.mean(first_chars):.2f}s")
+    print(f"  time to complete final answer: {statistics.mean(finals):.2f}s")
+
+def bench_isolation(args):
+    """
+    Measure the streaming latency of a light session while heavy sessions burn CPU in their tool calls
+    (holding the GIL, like CPU-heavy generated code), with agents in the server process vs in a worker pool.
+    """
+    from agent_ui import AgentUI
+    from worker_pool import RemoteAgent, WorkerPool
+
+    heavy_factory = functools.partial(
+        StubAgent, steps=args.steps, token_latency=args.token_latency, tool_latency=0.0, tool_cpu=args.tool_cpu)
+    light_factory = functools.partial(
+        StubAgent, steps=args.steps, token_latency=args.token_latency, tool_latency=args.tool_latency)
+
+    def measure(make_heavy, make_light, heavy: int) -> list[float]:
+        stop = threading.Event()
+
+        def heavy_session(index: int):
+            agent = make_heavy(f"heavy-{index}")
+            while not stop.is_set():
+                for _ in agent.run("heavy query"):
+                    pass
+
+        threads = [threading.Thread(target=heavy_session, args=(index,), daemon=True) for index in range(heavy)]
+        for thread in threads:
+            thread.start()
+        gaps = []
+        agent_ui = AgentUI(make_light("light"))
+        for run in range(args.runs):
+            last = None
+            for _ in agent_ui.interact_with_agent(f"query {run}", [], []):
+                now = time.perf_counter()
+                if last is not None:
+                    gaps.append(now - last)
+                last = now
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return gaps
+
+    def report(name: str, gaps: list[float]):
+        print(
+            f"{name:>10}: update gap p50 {percentile(gaps, 0.5) * 1000:5.0f}ms"
+            f" p99 {percentile(gaps, 0.99) * 1000:5.0f}ms max {max(gaps) * 1000:5.0f}ms"
+        )
+
+    report("idle", measure(heavy_factory, light_factory, 0))
+    report("in-process", measure(heavy_factory, light_factory, args.heavy))
+
+    heavy_pool = WorkerPool(heavy_factory, size=args.heavy)
+    light_pool = WorkerPool(light_factory, size=1)
+    try:
+        # the light worker startup is not measured (heavy workers starting only add to the CPU load)
+        list(RemoteAgent(light_pool, "warm-up").run("warm up"))
+        report("pool", measure(
+            functools.partial(RemoteAgent, heavy_pool), functools.partial(RemoteAgent, light_pool), args.heavy))
+    finally:
+        heavy_pool.close()
+        light_pool.close()
+
+def bench_condense(args):
+    """
+    Condense synthetic large pages with a stub small model and report the token savings and added latency.
+    """
+    import random
+
+    from smolagents.models import ChatMessage, MessageRole
+    from smolagents.monitoring import TokenUsage
+
+    from condense import CHARS_PER_TOKEN, Condenser
+
+    class StubModel:
+        """
+        Keeps the lines of a chunk mentioning the task subject, after a latency proportional to the chunk size.
+        """
+        def __call__(self, messages):
+            prompt = messages[0]["content"][0]["text"]
+            time.sleep(args.model_latency * len(prompt) / args.chunk_chars)
+            relevant = [line for line in prompt.split("\n")[6:] if "solar" in line]
+            return ChatMessage(
+                role=MessageRole.ASSISTANT,
+                content="\n".join(relevant) or "NONE",
+                token_usage=TokenUsage(
+                    input_tokens=len(prompt) // CHARS_PER_TOKEN, output_tokens=sum(map(len, relevant)) // CHARS_PER_TOKEN),
+            )
+
+    random.seed(0)
+    words = ["energy", "grid", "storage", "policy", "market", "report", "capacity", "price", "solar"]
+    condenser = Condenser(
+        model=StubModel(), threshold_chars=args.threshold, chunk_chars=args.chunk_chars, max_workers=args.workers)
+    for index in range(args.pages):
+        page = "\n\n".join(
+            " ".join(random.choice(words[:-1]) for _ in range(60)) + (" solar panels output" if random.random() < 0.1 else "")
+            for _ in range(args.page_chars // 400)
+        )
+        outcome = condenser.condense(page, "How much solar capacity was installed?", f"https://example.com/page{index}")
+        if outcome is None:
+            print(f"page {index}: {len(page)} characters, not condensed")
+    stats = condenser.stats
+    print(
+        f"{stats['pages']} pages condensed: {stats['tokens_saved']} tokens saved for {stats['model_tokens']} small model tokens, "
+        f"+{stats['latency_s'] / max(stats['pages'], 1):.2f}s per page ({args.workers} concurrent model calls)"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline SmolAlbert benchmarks against stub agents.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    api_parser = subparsers.add_parser("api", help="HTTP API (SSE) vs Gradio event throughput")
+    api_parser.add_argument("--sessions", type=int, default=8, help="number of concurrent sessions")
+    api_parser.add_argument("--runs", type=int, default=3, help="number of runs per session")
+    api_parser.add_argument("--steps", type=int, default=3, help="number of agent steps per run")
+    api_parser.add_argument("--token-latency", type=float, default=0.01, help="delay between streamed tokens (s)")
+    api_parser.add_argument("--tool-latency", type=float, default=0.2, help="simulated tool call duration (s)")
+    api_parser.add_argument("--port", type=int, default=7861)
+    api_parser.set_defaults(func=bench_api)
+
+    parallel_parser = subparsers.add_parser("parallel", help="sequential tool calls vs parallel_map")
+    parallel_parser.add_argument("--delays", type=float, nargs="+", default=[0.5, 1.0, 0.3, 0.8], help="stub tool delays (s)")
+    parallel_parser.add_argument("--workers", type=int, default=4, help="parallel_map pool size")
+    parallel_parser.add_argument("--timeout", type=float, default=60.0, help="per-call timeout (s)")
+    parallel_parser.set_defaults(func=bench_parallel)
+
+    resilience_parser = subparsers.add_parser("resilience", help="tail latency with hedging and circuit breaking")
+    resilience_parser.add_argument("--calls", type=int, default=400, help="number of calls per measurement")
+    resilience_parser.add_argument("--fast", type=float, default=0.02, help="usual stub latency (s)")
+    resilience_parser.add_argument("--slow", type=float, default=0.5, help="latency spike duration (s)")
+    resilience_parser.add_argument("--spike-rate", type=float, default=0.03, help="probability of a latency spike")
+    resilience_parser.add_argument("--hedge-percentile", type=float, default=0.9, help="latency percentile triggering a hedge")
+    resilience_parser.set_defaults(func=bench_resilience)
+
+    ttfa_parser = subparsers.add_parser("ttfa", help="time to first answer character in the Quiet tab")
+    ttfa_parser.add_argument("--runs", type=int, default=5, help="number of replayed runs")
+    ttfa_parser.add_argument("--steps", type=int, default=3, help="number of agent steps per run")
+    ttfa_parser.add_argument("--token-latency", type=float, default=0.02, help="delay between streamed tokens (s)")
+    ttfa_parser.add_argument("--tool-latency", type=float, default=0.5, help="simulated tool call duration (s)")
+    ttfa_parser.set_defaults(func=bench_ttfa)
+
+    isolation_parser = subparsers.add_parser("isolation", help="streaming latency next to CPU-heavy runs, in-process vs worker pool")
+    isolation_parser.add_argument("--heavy", type=int, default=3, help="number of concurrent CPU-heavy sessions")
+    isolation_parser.add_argument("--runs", type=int, default=3, help="number of runs of the measured light session")
+    isolation_parser.add_argument("--steps", type=int, default=3, help="number of agent steps per run")
+    isolation_parser.add_argument("--tool-cpu", type=float, default=1.0, help="CPU time burnt by each heavy tool call (s)")
+    isolation_parser.add_argument("--token-latency", type=float, default=0.02, help="delay between streamed tokens (s)")
+    isolation_parser.add_argument("--tool-latency", type=float, default=0.2, help="light session tool call duration (s)")
+    isolation_parser.set_defaults(func=bench_isolation)
+
+    condense_parser = subparsers.add_parser("condense", help="token savings and latency of extract condensation")
+    condense_parser.add_argument("--pages", type=int, default=4, help="number of synthetic pages")
+    condense_parser.add_argument("--page-chars", type=int, default=60000, help="size of the pages (characters)")
+    condense_parser.add_argument("--threshold", type=int, default=20000, help="condensation threshold (characters)")
+    condense_parser.add_argument("--chunk-chars", type=int, default=8000, help="chunk size (characters)")
+    condense_parser.add_argument("--workers", type=int, default=4, help="maximum concurrent model calls")
+    condense_parser.add_argument("--model-latency", type=float, default=1.0, help="stub model latency per full chunk (s)")
+    condense_parser.set_defaults(func=bench_condense)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Helpers shared by the offline benchmark and load test scripts (bench.py, loadtest.py).
+"""
+
+import threading
+import time
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Return the q-th percentile (0-1) of the values, 0 if there are none.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def start_server(agent_factory, port: int):
+    """
+    Serve the HTTP API and the Gradio UI with stub agents in a background thread.
+    """
+    import gradio as gr
+    import uvicorn
+
+    from agent_ui import AgentUI
+    from api import create_api
+    from sessions import SessionManager
+
+    session_manager = SessionManager(agent_factory=agent_factory, sweep_interval=0)
+    agent_ui = AgentUI(agent_factory(), session_manager=session_manager)
+    app = gr.mount_gradio_app(create_api(session_manager), agent_ui.create_app(), path="/")
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.1)
+    return server
@@ -0,0 +1,308 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Tavily credits of a single call, per depth
+CREDIT_COSTS = {
+    "search": {"basic": 1, "advanced": 2},
+    "extract": {"basic": 1, "advanced": 2},
+}
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a Tavily call is refused by the budget governor.
+    """
+
+class RollingBudget:
+    """
+    A credit budget over a rolling time window.
+    """
+
+    def __init__(self, limit: float | None, window: float):
+        """
+        Construct the RollingBudget (a None limit means unlimited, spend is still tracked).
+        """
+        self.limit = limit
+        self.window = window
+        self._spends = deque()
+        self._total = 0.0
+
+    def _prune(self, now: float):
+        while self._spends and self._spends[0][0] < now - self.window:
+            self._total -= self._spends.popleft()[1]
+
+    def spend(self, credits: float, at: float | None = None):
+        """
+        Account for credits spent at the given time (now by default, past spends must be given in order).
+        """
+        now = time.time()
+        self._prune(now)
+        self._spends.append((now if at is None else at, credits))
+        self._total += credits
+
+    def spent(self) -> float:
+        self._prune(time.time())
+        return self._total
+
+    def remaining(self) -> float:
+        if self.limit is None:
+            return float("inf")
+        return max(0.0, self.limit - self.spent())
+
+    def remaining_ratio(self) -> float:
+        if self.limit is None:
+            return 1.0
+        return self.remaining() / self.limit if self.limit > 0 else 0.0
+
+def query_difficulty(query: str) -> float:
+    """
+    Estimate how much a query benefits from advanced depth, from 0 (simple lookup) to 1 (hard research query).
+    """
+    query = query.lower()
+    words = query.split()
+    score = min(len(words), 20) / 40                                                      # long queries
+    score += 0.15 * bool(re.search(r"\b(vs|versus|compare|comparison|difference|between)\b", query))
+    score += 0.15 * bool(re.search(r"\b(why|how|explain|analysis|impact|review|pros|cons)\b", query))
+    score += 0.1 * bool(re.search(r"\d", query))                                           # dates, figures
+    score += 0.1 * ('"' in query)                                                          # exact phrases
+    return min(score, 1.0)
+
+class BudgetGovernor:
+    """
+    Governs Tavily credit spend with a global budget and per-session budgets over a rolling window.
+    Calls run at advanced depth only when advanced mode is requested, the remaining budget allows it
+    and the query is hard enough: the closer to the end of the budget, the harder the query must be.
+    Searches and extracts are also capped per agent run.
+    The cost of an authorized call is reserved until the call is recorded, so that concurrent calls
+    cannot all pass the check for the last credits.
+    With a database path, spends are persisted so that the budgets survive restarts.
+    """
+
+    def __init__(
+        self,
+        global_limit: float | None = None,
+        session_limit: float | None = None,
+        window: float = 30 * 24 * 3600.0,
+        max_searches_per_run: int | None = None,
+        max_extracts_per_run: int | None = None,
+        path: str | None = None,
+    ):
+        """
+        Construct the BudgetGovernor.
+
+        Args:
+            global_limit: Credits all sessions may spend over the window (None for unlimited).
+            session_limit: Credits a single session may spend over the window (None for unlimited).
+            window: Rolling window duration (seconds), e.g. the billing period.
+            max_searches_per_run: Maximum number of searches per agent run (None for unlimited).
+            max_extracts_per_run: Maximum number of extracts per agent run (None for unlimited).
+            path: SQLite database path where spends are persisted (None to keep them in memory only).
+        """
+        self.session_limit = session_limit
+        self.window = window
+        self.max_calls_per_run = {"search": max_searches_per_run, "extract": max_extracts_per_run}
+        self._global = RollingBudget(global_limit, window)
+        self._sessions: dict[str, RollingBudget] = {}
+        self._last_active: dict[str, float] = {}
+        # credits reserved by authorized calls not recorded yet, in total and per session
+        self._reserved_total = 0.0
+        self._reserved: dict[str, float] = {}
+        self._run_calls: dict[str, dict[str, int]] = {}
+        self._run_tasks: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        self._conn = None
+        if path is not None:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS spends (session_id TEXT NOT NULL, spent_at REAL NOT NULL, credits REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS spends_session ON spends (session_id, spent_at);"
+                "CREATE INDEX IF NOT EXISTS spends_spent_at ON spends (spent_at);"
+            )
+            self._conn.commit()
+            for spent_at, credits in self._conn.execute(
+                "SELECT spent_at, credits FROM spends WHERE spent_at >= ? ORDER BY spent_at", (time.time() - window,)
+            ):
+                self._global.spend(credits, at=spent_at)
+
+    def _session(self, session_id: str) -> RollingBudget:
+        self._last_active[session_id] = time.monotonic()
+        budget = self._sessions.get(session_id)
+        if budget is None:
+            budget = self._sessions[session_id] = RollingBudget(self.session_limit, self.window)
+            if self._conn is not None:
+                for spent_at, credits in self._conn.execute(
+                    "SELECT spent_at, credits FROM spends WHERE session_id = ? AND spent_at >= ? ORDER BY spent_at",
+                    (session_id, time.time() - self.window),
+                ):
+                    budget.spend(credits, at=spent_at)
+        return budget
+
+    def _remaining(self, session_id: str) -> float:
+        reserved = self._reserved.get(session_id, 0.0)
+        return min(self._global.remaining() - self._reserved_total, self._session(session_id).remaining() - reserved)
+
+    def start_run(self, session_id: str, task: str):
+        """
+        Reset the per-run call counters of a session, at the beginning of an agent run.
+        """
+        with self._lock:
+            self._last_active[session_id] = time.monotonic()
+            self._run_calls[session_id] = {"search": 0, "extract": 0}
+            self._run_tasks[session_id] = task
+
+    def authorize(self, session_id: str, kind: str, query: str | None, advanced_requested: bool) -> str:
+        """
+        Authorize a "search" or "extract" call and return the depth ("basic" or "advanced") it must use.
+        Without a query (e.g. for extracts), the difficulty is estimated from the task of the current run.
+        The cost of the call at that depth (see CREDIT_COSTS) is reserved: it must be given back to record.
+        Raises BudgetExceeded if the call is refused.
+        """
+        with self._lock:
+            session = self._session(session_id)
+            run_calls = self._run_calls.setdefault(session_id, {"search": 0, "extract": 0})
+
+            max_calls = self.max_calls_per_run[kind]
+            if max_calls is not None and run_calls[kind] >= max_calls:
+                raise BudgetExceeded(f"no more than {max_calls} {kind} calls per request, answer with what you already have")
+
+            remaining = self._remaining(session_id)
+            costs = CREDIT_COSTS[kind]
+            if remaining < costs["basic"]:
+                raise BudgetExceeded("Tavily credit budget exhausted, use local_search or answer with what you already have")
+
+            depth = "basic"
+            if advanced_requested and remaining >= costs["advanced"]:
+                pressure = 1.0 - min(self._global.remaining_ratio(), session.remaining_ratio())
+                if query is None:
+                    query = self._run_tasks.get(session_id, "")
+                if query_difficulty(query) >= pressure:
+                    depth = "advanced"
+
+            run_calls[kind] += 1
+            self._reserved_total += costs[depth]
+            self._reserved[session_id] = self._reserved.get(session_id, 0.0) + costs[depth]
+            return depth
+
+    def allows_hedge(self, session_id: str, credits: float) -> bool:
+        """
+        Return whether a hedged (duplicate) request costing the given credits may be sent:
+        only while the budget is far from exhausted.
+        """
+        with self._lock:
+            session = self._session(session_id)
+            if self._remaining(session_id) < credits:
+                return False
+            return min(self._global.remaining_ratio(), session.remaining_ratio()) > 0.5
+
+    def record(self, session_id: str, credits: float, reserved: float = 0.0):
+        """
+        Account for credits actually spent by a session, settling the credits reserved for the call
+        (to be called even when nothing was spent, e.g. when the call failed).
+        """
+        with self._lock:
+            if reserved:
+                self._reserved_total = max(0.0, self._reserved_total - reserved)
+                session_reserved = self._reserved.get(session_id, 0.0) - reserved
+                if session_reserved > 0:
+                    self._reserved[session_id] = session_reserved
+                else:
+                    self._reserved.pop(session_id, None)
+            if not credits:
+                return
+            self._global.spend(credits)
+            self._session(session_id).spend(credits)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO spends (session_id, spent_at, credits) VALUES (?, ?, ?)", (session_id, time.time(), credits)
+                )
+                self._conn.commit()
+
+    def report(self, session_id: str | None = None) -> str:
+        """
+        Return a human-readable report of the credits spent over the window.
+        """
+        def describe(budget: RollingBudget) -> str:
+            spent = budget.spent()
+            return f"{spent:g}/{budget.limit:g}" if budget.limit is not None else f"{spent:g}"
+
+        with self._lock:
+            report = f"global: {describe(self._global)}"
+            if session_id is not None:
+                report = f"session: {describe(self._session(session_id))} | {report}"
+        return report
+
+    def session_spends(self) -> dict[str, float]:
+        """
+        Return the credits spent by each session over the window.
+        """
+        with self._lock:
+            if self._conn is not None:
+                rows = self._conn.execute(
+                    "SELECT session_id, SUM(credits) FROM spends WHERE spent_at >= ? GROUP BY session_id",
+                    (time.time() - self.window,),
+                ).fetchall()
+                return dict(rows)
+            return {session_id: budget.spent() for session_id, budget in self._sessions.items()}
+
+    def prune(self, idle_timeout: float) -> int:
+        """
+        Forget the sessions inactive for more than idle_timeout seconds and return how many were forgotten.
+        Persisted budgets are reloaded on the next call of a session, in memory only the sessions which spent
+        nothing over the window can be forgotten. Spends older than the window are deleted from the database.
+        """
+        threshold = time.monotonic() - idle_timeout
+        with self._lock:
+            idle = [
+                session_id for session_id, last_active in self._last_active.items()
+                if last_active < threshold
+                and (self._conn is not None or session_id not in self._sessions or self._sessions[session_id].spent() == 0)
+            ]
+            for session_id in idle:
+                del self._last_active[session_id]
+                self._sessions.pop(session_id, None)
+                self._run_calls.pop(session_id, None)
+                self._run_tasks.pop(session_id, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM spends WHERE spent_at < ?", (time.time() - self.window,))
+                self._conn.commit()
+        return len(idle)
+
+_default_governor = BudgetGovernor()
+
+def get_default_governor() -> BudgetGovernor:
+    """
+    Return the budget governor shared by all the agents of the process.
+    """
+    return _default_governor
+
+def set_default_governor(governor: BudgetGovernor):
+    """
+    Replace the budget governor shared by all the agents of the process (before creating agents).
+    """
+    global _default_governor
+    _default_governor = governor
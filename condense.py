@@ -0,0 +1,206 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from providers import get_default_provider_manager
+from resilience import ResilientInferenceClientModel
+
+# small and cheap model condensing the pages
+DEFAULT_MODEL_ID = "Qwen/Qwen3-30B-A3B-Instruct-2507"
+
+# rough size of a token, to report savings without loading a tokenizer
+CHARS_PER_TOKEN = 4
+
+CONDENSE_PROMPT = """You condense a part of a web page for a research assistant working on this task:
+{task}
+
+Keep only the information of this part that is relevant to the task: facts, figures, names, dates, code, quotes,
+in the wording of the page. Do not add anything. If nothing is relevant, answer NONE.
+
+Part of {url} (characters {start} to {end}):
+{chunk}"""
+
+REDUCE_PROMPT = """Merge these notes taken from {url} into a single digest focused on this task:
+{task}
+
+Remove duplicates but keep every relevant fact, and keep the [chars start-end] marker of each fact's source part.
+
+{notes}"""
+
+def split_chunks(text: str, chunk_chars: int) -> list[tuple[int, int]]:
+    """
+    Split a text into (start, end) spans of about chunk_chars characters, cut at paragraph or line breaks when possible.
+    """
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            # cut at the last paragraph break, else line break, of the second half of the chunk
+            window = text[start + chunk_chars // 2:end]
+            cut = max(window.rfind("\n\n"), window.rfind("\n"))
+            if cut >= 0:
+                end = start + chunk_chars // 2 + cut + 1
+        spans.append((start, end))
+        start = end
+    return spans
+
+class Condenser:
+    """
+    Condenses large extracted pages into task-focused digests with a small model (map-reduce):
+    pages are split into chunks condensed in parallel, then the partial digests are merged in page order,
+    each one marked with the character offsets of its source part for citations.
+    Only pages above a size threshold are condensed, and the digest replaces the page only if it is smaller.
+    """
+
+    def __init__(
+        self,
+        model=None,
+        threshold_chars: int = 20000,
+        chunk_chars: int = 8000,
+        max_workers: int = 4,
+        max_chunks: int = 24,
+    ):
+        """
+        Construct the Condenser.
+
+        Args:
+            model: Model condensing the chunks (defaults to a small instruct model on HF inference providers).
+            threshold_chars: Page size (characters) above which pages are condensed.
+            chunk_chars: Chunk size (characters).
+            max_workers: Maximum number of concurrent model calls, shared by all the pages being condensed.
+            max_chunks: Maximum number of chunks condensed per page, the rest of the page is dropped.
+        """
+        self.model = model or ResilientInferenceClientModel(
+            model_id=DEFAULT_MODEL_ID,
+            provider="auto",
+            provider_manager=get_default_provider_manager(),
+            token=os.getenv("HF_API_KEY"),
+        )
+        self.threshold_chars = threshold_chars
+        self.chunk_chars = chunk_chars
+        self.max_chunks = max_chunks
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="condense")
+        self._lock = threading.Lock()
+        self.stats = {"pages": 0, "chunks": 0, "failed_chunks": 0, "tokens_saved": 0, "model_tokens": 0, "latency_s": 0.0}
+
+    def _generate(self, prompt: str) -> tuple[str, int]:
+        """
+        Call the model and return its answer and the tokens it used.
+        """
+        message = self.model([{"role": "user", "content": [{"type": "text", "text": prompt}]}])
+        usage = message.token_usage
+        tokens = usage.input_tokens + usage.output_tokens if usage is not None else len(prompt) // CHARS_PER_TOKEN
+        return (message.content or "").strip(), tokens
+
+    def _condense_chunk(self, task: str, url: str, text: str, start: int, end: int) -> tuple[str, int, bool]:
+        """
+        Condense a chunk and return its digest (empty if irrelevant), the model tokens used and whether it succeeded.
+        On failure the chunk is kept as-is, nothing is lost.
+        """
+        try:
+            digest, tokens = self._generate(
+                CONDENSE_PROMPT.format(task=task or "(unknown)", url=url, start=start, end=end, chunk=text[start:end])
+            )
+        except Exception as e:
+            print(f"Could not condense {url} characters {start}-{end}: {e}")
+            return text[start:end], 0, False
+        if re.fullmatch(r"\W*NONE\W*", digest):
+            digest = ""
+        return digest, tokens, True
+
+    def condense(self, text: str, task: str, url: str = "") -> tuple[str, dict] | None:
+        """
+        Condense a page for the given task and return (digest, report), or None if the page is below the threshold
+        or could not be made smaller. The report holds the estimated token savings and the added latency.
+        """
+        if len(text) <= self.threshold_chars:
+            return None
+
+        start_time = time.perf_counter()
+        spans = split_chunks(text, self.chunk_chars)[:self.max_chunks]
+        futures = [self._executor.submit(self._condense_chunk, task, url, text, start, end) for start, end in spans]
+        results = [future.result() for future in futures]
+        model_tokens = sum(tokens for _, tokens, _ in results)
+        failed = sum(not succeeded for _, _, succeeded in results)
+
+        notes = "\n\n".join(
+            f"[chars {start}-{end}]\n{digest}" for (start, end), (digest, _, _) in zip(spans, results) if digest
+        )
+        # merge the notes when they are still large (e.g. facts repeated across chunks)
+        if failed == 0 and len(notes) > self.chunk_chars:
+            try:
+                notes, tokens = self._generate(REDUCE_PROMPT.format(url=url, task=task or "(unknown)", notes=notes))
+                model_tokens += tokens
+            except Exception as e:
+                print(f"Could not merge the digests of {url}: {e}")
+        if re.fullmatch(r"\W*(NONE)?\W*", notes):
+            # every chunk was irrelevant: say so rather than handing an empty page to the agent
+            notes = f"[chars 0-{spans[-1][1]}]\nNo content relevant to the task on this page."
+        if spans[-1][1] < len(text):
+            notes += f"\n\n[chars {spans[-1][1]}-{len(text)} not condensed: page too long]"
+
+        latency = time.perf_counter() - start_time
+        if len(notes) >= len(text):
+            return None
+
+        report = {
+            "original_tokens": len(text) // CHARS_PER_TOKEN,
+            "digest_tokens": len(notes) // CHARS_PER_TOKEN,
+            "tokens_saved": (len(text) - len(notes)) // CHARS_PER_TOKEN,
+            "model_tokens": model_tokens,
+            "chunks": len(spans),
+            "failed_chunks": failed,
+            "latency_s": round(latency, 3),
+        }
+        with self._lock:
+            self.stats["pages"] += 1
+            self.stats["chunks"] += len(spans)
+            self.stats["failed_chunks"] += failed
+            self.stats["tokens_saved"] += report["tokens_saved"]
+            self.stats["model_tokens"] += model_tokens
+            self.stats["latency_s"] = round(self.stats["latency_s"] + latency, 3)
+        print(
+            f"Extract of {url} condensed: ~{report['original_tokens']} -> ~{report['digest_tokens']} tokens "
+            f"({len(spans)} chunks, {model_tokens} small model tokens, +{latency:.2f}s)."
+        )
+        return notes, report
+
+_default_condenser = None
+
+def get_default_condenser() -> Condenser | None:
+    """
+    Return the condenser shared by all the agents of the process, or None if condensation is disabled (default).
+    """
+    return _default_condenser
+
+def set_default_condenser(condenser: Condenser | None):
+    """
+    Enable (or disable, with None) the condenser shared by all the agents of the process, before creating agents.
+    """
+    global _default_condenser
+    _default_condenser = condenser
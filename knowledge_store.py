@@ -0,0 +1,256 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import hashlib
+import queue
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# query parameters that do not change the content of a page
+_TRACKING_PARAMS = re.compile(r"^(utm_.*|fbclid|gclid|mc_cid|mc_eid|ref|ref_src)$", re.IGNORECASE)
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonicalize a URL so that the same page fetched through different links is stored once:
+    lowercase scheme and host, no "www.", no default port, no fragment, no tracking parameters,
+    sorted query parameters and no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and not (scheme == "http" and parts.port == 80 or scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(key)
+    ))
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, host, path, query, ""))
+
+class KnowledgeStore:
+    """
+    A local full-text index (SQLite FTS5) of the pages and snippets previously fetched from the web.
+    Documents are keyed by canonical URL, deduplicated by content hash and timestamped so that
+    stale ones can be told apart and evicted.
+    Ingestion is asynchronous: documents are queued and indexed by a background writer thread.
+    """
+
+    def __init__(
+        self,
+        path: str = "knowledge.db",
+        max_documents: int = 50000,
+        max_age: float = 30 * 24 * 3600.0,
+        queue_size: int = 1000,
+    ):
+        """
+        Construct the KnowledgeStore.
+
+        Args:
+            path: SQLite database path.
+            max_documents: Maximum number of indexed documents, the oldest ones are evicted beyond.
+            max_age: Age (seconds) after which documents are evicted.
+            queue_size: Maximum number of documents waiting to be indexed, new ones are dropped beyond.
+        """
+        self.path = path
+        self.max_documents = max_documents
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, "
+            "url TEXT UNIQUE NOT NULL, "
+            "content_hash TEXT NOT NULL, "
+            "source TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS documents_hash ON documents (content_hash);"
+            "CREATE INDEX IF NOT EXISTS documents_fetched_at ON documents (fetched_at);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(title, content);"
+            "CREATE TABLE IF NOT EXISTS aliases (url TEXT PRIMARY KEY, document_id INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS aliases_document ON aliases (document_id);"
+        )
+        self._conn.commit()
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._ingested = 0
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def ingest(self, url: str, title: str, content: str, source: str):
+        """
+        Queue a document for indexing without blocking the caller.
+        Documents are dropped if the indexing queue is full.
+        """
+        if not url or not content:
+            return
+        try:
+            self._queue.put_nowait((url, title or "", content, source, time.time()))
+        except queue.Full:
+            pass
+
+    def flush(self):
+        """
+        Block until all the queued documents are indexed.
+        """
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            document = self._queue.get()
+            try:
+                self._index(*document)
+                self._ingested += 1
+                # evict periodically rather than after every single document
+                if self._ingested % 100 == 0:
+                    self.evict()
+            except Exception as e:
+                print(f"KnowledgeStore indexing failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _index(self, url: str, title: str, content: str, source: str, fetched_at: float):
+        """
+        Insert or refresh a document in the index.
+        """
+        url = canonicalize_url(url)
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, content_hash, source FROM documents WHERE url = ?", (url,)
+            ).fetchone()
+
+            if row is not None:
+                doc_id, previous_hash, previous_source = row
+                # a search snippet never replaces the extracted page it was taken from
+                if previous_hash == content_hash or (source == "search" and previous_source == "extract"):
+                    self._conn.execute("UPDATE documents SET fetched_at = ? WHERE id = ?", (fetched_at, doc_id))
+                else:
+                    self._conn.execute(
+                        "UPDATE documents SET content_hash = ?, source = ?, fetched_at = ? WHERE id = ?",
+                        (content_hash, source, fetched_at, doc_id),
+                    )
+                    self._conn.execute(
+                        "UPDATE documents_fts SET title = ?, content = ? WHERE rowid = ?", (title, content, doc_id)
+                    )
+                    # the mirrors of the previous content are not mirrors anymore
+                    self._conn.execute("DELETE FROM aliases WHERE document_id = ?", (doc_id,))
+            else:
+                # the same content published under another URL is indexed only once, the URL becomes an alias
+                duplicate = self._conn.execute(
+                    "SELECT id FROM documents WHERE content_hash = ?", (content_hash,)
+                ).fetchone()
+                if duplicate is not None:
+                    self._conn.execute(
+                        "UPDATE documents SET fetched_at = ?, "
+                        "source = CASE WHEN ? = 'extract' THEN 'extract' ELSE source END WHERE id = ?",
+                        (fetched_at, source, duplicate[0]),
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO aliases (url, document_id) VALUES (?, ?)", (url, duplicate[0])
+                    )
+                else:
+                    self._conn.execute("DELETE FROM aliases WHERE url = ?", (url,))
+                    cursor = self._conn.execute(
+                        "INSERT INTO documents (url, content_hash, source, fetched_at) VALUES (?, ?, ?, ?)",
+                        (url, content_hash, source, fetched_at),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO documents_fts (rowid, title, content) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, title, content),
+                    )
+            self._conn.commit()
+
+    def evict(self):
+        """
+        Remove the documents older than max_age, then the oldest ones beyond max_documents.
+        """
+        with self._lock:
+            expired = self._conn.execute(
+                "SELECT id FROM documents WHERE fetched_at < ? "
+                "UNION SELECT id FROM (SELECT id FROM documents ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.max_age, self.max_documents),
+            ).fetchall()
+            if expired:
+                self._conn.executemany("DELETE FROM documents WHERE id = ?", expired)
+                self._conn.executemany("DELETE FROM documents_fts WHERE rowid = ?", expired)
+                self._conn.executemany("DELETE FROM aliases WHERE document_id = ?", expired)
+                self._conn.commit()
+
+    def get(self, url: str) -> dict | None:
+        """
+        Return the indexed document of the given URL (or of which the URL is an alias), if any.
+        """
+        url = canonicalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT d.url, f.title, f.content, d.source, d.fetched_at "
+                "FROM documents d JOIN documents_fts f ON f.rowid = d.id "
+                "WHERE d.id = COALESCE((SELECT id FROM documents WHERE url = ?), "
+                "(SELECT document_id FROM aliases WHERE url = ?))",
+                (url, url),
+            ).fetchone()
+        if row is None:
+            return None
+        url, title, content, source, fetched_at = row
+        return {"url": url, "title": title, "content": content, "source": source, "fetched_at": fetched_at}
+
+    def search(self, query: str, max_results: int = 5) -> list[dict]:
+        """
+        Full-text search the indexed documents, best matches first.
+        """
+        # quote every term so that user input cannot be interpreted as FTS5 syntax
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.url, f.title, snippet(documents_fts, 1, '', '', ' ... ', 48), d.source, d.fetched_at "
+                "FROM documents_fts f JOIN documents d ON d.id = f.rowid "
+                "WHERE documents_fts MATCH ? ORDER BY bm25(documents_fts) LIMIT ?",
+                (match, max_results),
+            ).fetchall()
+
+        return [
+            {"url": url, "title": title, "content": snippet, "source": source, "fetched_at": fetched_at}
+            for url, title, snippet, source, fetched_at in rows
+        ]
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_default_store() -> KnowledgeStore:
+    """
+    Return the knowledge store shared by all the agents of the process.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = KnowledgeStore()
+        return _default_store
@@ -0,0 +1,269 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Concurrent-session load test of the UI streaming path, against StubAgent (no model or Tavily calls).
+
+Simulated users run prompts through AgentUI.interact_with_agent, either in-process or through the
+Gradio queue of a local server, at increasing concurrency levels. Each level reports the throughput,
+the time to first token (first streamed update after the prompt echo), the inter-update latency
+percentiles, the CPU time per session and the memory growth of the process.
+Results are appended as one JSON line per load test, tagged with the git commit, so that runs can be
+compared across commits.
+
+Usage:
+    python loadtest.py --sessions 1 8 32 --runs 3
+    python loadtest.py --mode gradio --sessions 1 4 16
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from bench_utils import percentile, start_server
+from stub_agent import StubAgent
+
+def _rss_mib() -> float:
+    """
+    Return the resident memory of the process (MiB), or its peak where the current one is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KiB elsewhere
+        return peak / 2**20 if platform.system() == "Darwin" else peak / 2**10
+
+def _cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _git_commit() -> dict:
+    """
+    Return the current git commit and whether the working tree has uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+class RunTrace:
+    """
+    Timestamps of the UI updates of a single run.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.updates = []
+
+    def update(self):
+        self.updates.append(time.perf_counter())
+
+    def ttft(self) -> float | None:
+        # the first update only echoes the prompt
+        return self.updates[1] - self.start if len(self.updates) > 1 else None
+
+    def gaps(self) -> list[float]:
+        return [later - earlier for earlier, later in zip(self.updates[1:], self.updates[2:])]
+
+    def duration(self) -> float:
+        return (self.updates[-1] if self.updates else time.perf_counter()) - self.start
+
+class LoadTest:
+    """
+    Runs simulated sessions at increasing concurrency levels and collects their metrics.
+    """
+
+    def __init__(self, agent_factory, mode: str = "inprocess", runs: int = 3, think_time: float = 0.0, port: int = 7862):
+        """
+        Construct the LoadTest.
+
+        Args:
+            agent_factory: Callable building the (stub) agent of a session, given the session id.
+            mode: "inprocess" to call AgentUI.interact_with_agent directly, "gradio" to go through the Gradio queue.
+            runs: Number of prompts sent by each simulated session.
+            think_time: Pause of each simulated user between two prompts (seconds).
+            port: Local server port (gradio mode).
+        """
+        self.agent_factory = agent_factory
+        self.mode = mode
+        self.runs = runs
+        self.think_time = think_time
+        self.port = port
+        self.server = None
+
+    def __enter__(self):
+        if self.mode == "gradio":
+            self.server = start_server(self.agent_factory, self.port)
+        else:
+            from agent_ui import AgentUI
+            from sessions import SessionManager
+
+            self.session_manager = SessionManager(agent_factory=self.agent_factory, sweep_interval=0)
+            self.agent_ui = AgentUI(self.agent_factory(), session_manager=self.session_manager)
+        return self
+
+    def __exit__(self, *exc):
+        if self.server is not None:
+            self.server.should_exit = True
+
+    def _inprocess_session(self, session_id: str) -> list[RunTrace]:
+        # stands in for the gr.Request Gradio passes to event handlers
+        request = SimpleNamespace(session_hash=session_id)
+        traces = []
+        verbose_messages, quiet_messages = [], []
+        for run in range(self.runs):
+            trace = RunTrace()
+            for verbose_messages, quiet_messages in self.agent_ui.interact_with_agent(
+                f"query {run}", verbose_messages, quiet_messages, request
+            ):
+                trace.update()
+            traces.append(trace)
+            time.sleep(self.think_time)
+        return traces
+
+    def _gradio_session(self, client) -> list[RunTrace]:
+        traces = []
+        for run in range(self.runs):
+            trace = RunTrace()
+            client.predict(f"query {run}", api_name="/disable_query")
+            for _ in client.submit(api_name="/interact_with_agent"):
+                trace.update()
+            traces.append(trace)
+            time.sleep(self.think_time)
+        return traces
+
+    def run_level(self, sessions: int, level_index: int) -> dict:
+        """
+        Run the given number of concurrent sessions to completion and return the metrics of the level.
+        """
+        if self.mode == "gradio":
+            from gradio_client import Client
+
+            # clients are connected beforehand, connecting is not part of the measured load
+            url = f"http://127.0.0.1:{self.port}"
+            with ThreadPoolExecutor(max_workers=sessions) as pool:
+                clients = list(pool.map(lambda _: Client(url, verbose=False), range(sessions)))
+            session, arguments = self._gradio_session, clients
+        else:
+            session, arguments = self._inprocess_session, [f"load-{level_index}-{index}" for index in range(sessions)]
+
+        gc.collect()
+        rss_before = _rss_mib()
+        threads_before = threading.active_count()
+        cpu_before = _cpu_time()
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(session, arguments))
+        elapsed = time.perf_counter() - start_time
+        cpu = _cpu_time() - cpu_before
+        gc.collect()
+        rss_after = _rss_mib()
+
+        traces = [trace for result in results for trace in result]
+        ttfts = [trace.ttft() for trace in traces if trace.ttft() is not None]
+        gaps = [gap for trace in traces for gap in trace.gaps()]
+        durations = [trace.duration() for trace in traces]
+        return {
+            "sessions": sessions,
+            "runs": len(traces),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_runs_per_s": round(len(traces) / elapsed, 3),
+            "updates_per_run": round(sum(len(trace.updates) for trace in traces) / len(traces), 1),
+            "run_duration_s": {q: round(percentile(durations, p), 4) for q, p in (("p50", 0.5), ("p95", 0.95))},
+            "ttft_s": {q: round(percentile(ttfts, p), 4) for q, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "inter_update_s": {
+                q: round(percentile(gaps, p), 4) for q, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+            },
+            "cpu_s_per_session": round(cpu / sessions, 4),
+            "cpu_utilization": round(cpu / elapsed, 3),
+            "rss_mib": {"before": round(rss_before, 1), "after": round(rss_after, 1), "growth": round(rss_after - rss_before, 1)},
+            "threads": {"before": threads_before, "after": threading.active_count()},
+        }
+
+def print_level(level: dict):
+    print(
+        f"{level['sessions']:>4} sessions: {level['throughput_runs_per_s']:6.2f} runs/s"
+        f" | ttft p50 {level['ttft_s']['p50']:.3f}s p95 {level['ttft_s']['p95']:.3f}s"
+        f" | update gap p50 {level['inter_update_s']['p50'] * 1000:.0f}ms p99 {level['inter_update_s']['p99'] * 1000:.0f}ms"
+        f" | cpu {level['cpu_s_per_session']:.3f}s/session"
+        f" | rss {level['rss_mib']['after']:.0f}MiB ({level['rss_mib']['growth']:+.1f})"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the SmolAlbert UI against stub agents.")
+    parser.add_argument("--mode", choices=["inprocess", "gradio"], default="inprocess", help="call AgentUI directly or through the Gradio queue")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16], help="concurrency levels (concurrent sessions)")
+    parser.add_argument("--runs", type=int, default=3, help="number of prompts per session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between two prompts of a session (s)")
+    parser.add_argument("--steps", type=int, default=3, help="number of agent steps per run")
+    parser.add_argument("--tokens-per-step", type=int, default=80, help="streamed tokens per intermediate step")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="streamed tokens of the final answer")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="delay between streamed tokens (s)")
+    parser.add_argument("--tool-latency", type=float, default=0.5, help="simulated tool call duration (s)")
+    parser.add_argument("--port", type=int, default=7862, help="local server port (gradio mode)")
+    parser.add_argument("--output", default="loadtest.jsonl", help="JSONL file the results are appended to")
+    args = parser.parse_args()
+
+    def agent_factory(session_id: str | None = None):
+        return StubAgent(
+            session_id=session_id,
+            steps=args.steps,
+            tokens_per_step=args.tokens_per_step,
+            token_latency=args.token_latency,
+            tool_latency=args.tool_latency,
+            answer_tokens=args.answer_tokens,
+        )
+
+    levels = []
+    with LoadTest(agent_factory, mode=args.mode, runs=args.runs, think_time=args.think_time, port=args.port) as load_test:
+        for index, sessions in enumerate(args.sessions):
+            level = load_test.run_level(sessions, index)
+            print_level(level)
+            levels.append(level)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "port")}
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        **_git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "levels": levels,
+    }
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.output}.")
+
+if __name__ == "__main__":
+    main()
@@ -21,9 +21,15 @@
 # THE SOFTWARE.
 
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pyexpat.errors import messages
 
-from smolagents import InferenceClientModel, Tool
+from smolagents import Tool
+
+from knowledge_store import KnowledgeStore
+from providers import get_default_provider_manager
+from resilience import ResilientInferenceClientModel
 
 class ImageQueryTool(Tool):
     """
@@ -50,9 +56,10 @@ class ImageQueryTool(Tool):
         # call superclass constructor
         super().__init__()
         # Initialize the model
-        self.model = InferenceClientModel(
+        self.model = ResilientInferenceClientModel(
             model_id="google/gemma-3-27b-it",
             provider="auto",
+            provider_manager=get_default_provider_manager(),
             token=os.getenv("HF_API_KEY")
         )
 
@@ -73,6 +80,129 @@ class ImageQueryTool(Tool):
         res = self.model(messages)
         return res.content
 
+class LocalSearchTool(Tool):
+    """
+    A tool to search the pages and snippets previously fetched from the web, at no Tavily credit cost.
+    """
+    name = "local_search"
+    description = (
+        "Search the pages and search results previously fetched from the web (free, no Tavily credits). "
+        "Each result tells how old it is: prefer Tavily tools when nothing relevant or recent enough is found."
+    )
+    inputs = {
+        "query": {
+            "type": "string",
+            "description": "The search query string.",
+        }
+    }
+    output_type = "string"
+
+    def __init__(self, knowledge_store: KnowledgeStore, max_results: int = 5):
+        """
+        Construct the LocalSearchTool on top of a knowledge store.
+        """
+        # call superclass constructor
+        super().__init__()
+
+        self.knowledge_store = knowledge_store
+        self.max_results = max_results
+
+    def forward(self, query: str):
+        """
+        Forward method to search the local knowledge store.
+        """
+        results = self.knowledge_store.search(query, max_results=self.max_results)
+        if not results:
+            return "No local results."
+
+        now = time.time()
+        return [
+            {
+                "url": result["url"],
+                "title": result["title"],
+                "content": result["content"],
+                "age_days": round((now - result["fetched_at"]) / 86400, 1),
+            }
+            for result in results
+        ]
+
+class ParallelMapTool(Tool):
+    """
+    A tool running several independent tool calls concurrently, so that a step lasts as long as its slowest call
+    instead of the sum of all calls.
+    """
+    name = "parallel_map"
+    description = (
+        "Run several independent tool calls concurrently and return their results as a list, in the same order. "
+        "Each call is a dict {'tool': <tool name>, 'args': {<argument name>: <value>, ...}}. "
+        "A call that fails or times out yields a string starting with 'Error' instead of its result. "
+        "Example: parallel_map(calls=[{'tool': 'tavily_search', 'args': {'query': 'a'}}, "
+        "{'tool': 'tavily_extract', 'args': {'url': 'https://example.com'}}])"
+    )
+    inputs = {
+        "calls": {
+            "type": "array",
+            "description": "The list of tool calls to run, as {'tool': <tool name>, 'args': {...}} dicts.",
+        }
+    }
+    output_type = "array"
+
+    def __init__(self, tools: list[Tool], max_workers: int = 4, timeout: float = 60.0):
+        """
+        Construct the ParallelMapTool.
+
+        Args:
+            tools: The tools that can be called.
+            max_workers: Maximum number of calls running at the same time.
+            timeout: Maximum duration of a single call (seconds), measured from its start.
+        """
+        # call superclass constructor
+        super().__init__()
+
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def forward(self, calls: list):
+        """
+        Forward method to run the tool calls on a bounded pool, keeping their order.
+        """
+        results = [None] * len(calls)
+        started = {}
+
+        def run_call(index: int, tool: Tool, args: dict):
+            started[index] = time.monotonic()
+            return tool(**args)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(calls))))
+        pending = {}
+        for index, call in enumerate(calls):
+            tool_name = call.get("tool") if isinstance(call, dict) else None
+            tool = self.tools.get(tool_name)
+            if tool is None:
+                results[index] = f"Error: unknown tool {tool_name!r}, available tools are {list(self.tools)}"
+                continue
+            pending[pool.submit(run_call, index, tool, call.get("args") or {})] = index
+
+        while pending:
+            done, _ = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = f"Error calling {calls[index]['tool']}: {e}"
+
+            # calls running for too long are abandoned (their thread cannot be killed, its result is dropped)
+            now = time.monotonic()
+            for future, index in list(pending.items()):
+                if index in started and now - started[index] > self.timeout:
+                    del pending[future]
+                    results[index] = f"Error calling {calls[index]['tool']}: timed out after {self.timeout}s"
+
+        pool.shutdown(wait=False, cancel_futures=True)
+        return results
+
 if __name__ == "__main__":
     tool = ImageQueryTool()
     response = tool.forward(
@@ -0,0 +1,311 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import difflib
+import io
+import json
+import re
+import sqlite3
+import threading
+import time
+import tokenize
+from typing import Generator, Iterable
+
+from smolagents.memory import ActionStep, FinalAnswerStep
+
+# tools whose calls make a plan worth reusing (the final_answer call alone is not a plan)
+PLAN_TOOLS = ("local_search", "tavily_search", "tavily_image_search", "tavily_extract", "image_query", "parallel_map")
+
+def prompt_tokens(prompt: str) -> list[str]:
+    """
+    Tokenize a prompt for shape matching: lowercase words, with numbers (dates, amounts...) generalized.
+    """
+    return ["<num>" if token.isdigit() else token for token in re.findall(r"\w+", prompt.lower())]
+
+def shape_similarity(tokens: list[str], other_tokens: list[str]) -> float:
+    """
+    Return how much two prompts share the same shape, from 0 to 1: the share of their words found
+    in the same order in both (so that prompts differing by a subject keep a high score even when short).
+    "price of bitcoin" and "price of gold" score 0.67, "latest news about X" and "latest news about Y"
+    0.75, unrelated prompts close to 0.
+    """
+    if not tokens and not other_tokens:
+        return 0.0
+    return difflib.SequenceMatcher(a=tokens, b=other_tokens, autojunk=False).ratio()
+
+# string literal tokens (f-strings are split in several tokens from Python 3.12)
+_STRING_TOKENS = {tokenize.STRING, getattr(tokenize, "FSTRING_MIDDLE", tokenize.STRING)}
+
+def adapt_code(code: str, prompt: str, new_prompt: str) -> str:
+    """
+    Replace, in the string literals of the code of a plan (queries, URLs...), the words of its prompt
+    that differ in the new prompt (e.g. the subject of "latest news about X") with their counterpart.
+    Only whole words are replaced, identifiers and keywords are never touched.
+    """
+    words, new_words = prompt.split(), new_prompt.split()
+    matcher = difflib.SequenceMatcher(a=[word.lower() for word in words], b=[word.lower() for word in new_words], autojunk=False)
+    replacements = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "replace":
+            continue
+        old = " ".join(words[i1:i2]).strip("?!.,;:\"'")
+        new = " ".join(new_words[j1:j2]).strip("?!.,;:\"'")
+        # a replacement needing escapes in the literal is not worth the risk of breaking the code
+        if old and new and not re.search(r"[\"'\\{}]", new):
+            replacements.append((re.compile(rf"(?<!\w){re.escape(old)}(?!\w)", re.IGNORECASE), new))
+    if not replacements:
+        return code
+
+    try:
+        tokens = [token for token in tokenize.generate_tokens(io.StringIO(code).readline) if token.type in _STRING_TOKENS]
+    except (tokenize.TokenError, SyntaxError):
+        return code
+    line_offsets = [0]
+    for line in io.StringIO(code).readlines():
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    # replace from the end so that the offsets of the previous literals stay valid
+    for token in reversed(tokens):
+        start = line_offsets[token.start[0] - 1] + token.start[1]
+        end = line_offsets[token.end[0] - 1] + token.end[1]
+        if code[start:end] != token.string:
+            # e.g. escaped braces of f-strings, whose token positions do not match the source
+            continue
+        formatted = False
+        if token.type == tokenize.STRING:
+            # leave the prefix and the quotes alone
+            quotes = re.match(r"([a-zA-Z]*)(\"\"\"|'''|\"|')", token.string)
+            start, end = start + quotes.end(), end - len(quotes.group(2))
+            formatted = "f" in quotes.group(1).lower()
+        # nor the replacement fields of f-strings (a single token before Python 3.12)
+        parts = re.split(r"(\{\{|\}\}|\{[^{}]*\})", code[start:end]) if formatted else [code[start:end]]
+        for index in range(0, len(parts), 2):
+            for pattern, new in replacements:
+                parts[index] = pattern.sub(lambda _: new, parts[index])
+        code = code[:start] + "".join(parts) + code[end:]
+    return code
+
+class PlanLibrary:
+    """
+    A library of the code plans of successful runs, keyed by the prompt they answered.
+    New prompts with the same shape as a stored prompt (matched locally, without model call) get the plan
+    injected in their task as a hint, so that the model adapts it instead of deriving it from scratch.
+    Plans whose hinted runs fail more than they succeed stop being suggested.
+    """
+
+    def __init__(self, path: str = "plans.db", min_similarity: float = 0.6, max_plans: int = 2000):
+        """
+        Construct the PlanLibrary.
+
+        Args:
+            path: SQLite database path.
+            min_similarity: Minimum shape similarity (see shape_similarity) for a plan to be suggested.
+            max_plans: Maximum number of stored plans, the least recently used ones are evicted beyond.
+        """
+        self.path = path
+        self.min_similarity = min_similarity
+        self.max_plans = max_plans
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "id INTEGER PRIMARY KEY, "
+            "prompt TEXT NOT NULL, "
+            "code TEXT NOT NULL, "
+            "tools TEXT NOT NULL, "
+            "steps INTEGER NOT NULL, "
+            "tokens INTEGER NOT NULL, "
+            "successes INTEGER NOT NULL DEFAULT 1, "
+            "failures INTEGER NOT NULL DEFAULT 0, "
+            "last_used_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # prompt shapes are matched in memory (the library is small), and reloaded when other processes
+        # (e.g. workers) change the library
+        self._shapes = {}
+        self._data_version = None
+
+    def _refresh_shapes(self):
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._shapes = {
+                plan_id: prompt_tokens(prompt)
+                for plan_id, prompt in self._conn.execute("SELECT id, prompt FROM plans").fetchall()
+            }
+            self._data_version = data_version
+
+    def _best_match(self, tokens: list[str]) -> tuple[int | None, float]:
+        self._refresh_shapes()
+        best_id, best_similarity = None, 0.0
+        for plan_id, shape in self._shapes.items():
+            similarity = shape_similarity(tokens, shape)
+            if similarity > best_similarity:
+                best_id, best_similarity = plan_id, similarity
+        return best_id, best_similarity
+
+    def match(self, prompt: str) -> dict | None:
+        """
+        Return the plan of the stored prompt with the most similar shape, with its "similarity",
+        or None if no plan is similar enough or reliable.
+        """
+        with self._lock:
+            plan_id, similarity = self._best_match(prompt_tokens(prompt))
+            if plan_id is None or similarity < self.min_similarity:
+                return None
+            row = self._conn.execute(
+                "SELECT prompt, code, tools, steps, tokens, successes, failures FROM plans WHERE id = ?", (plan_id,)
+            ).fetchone()
+            if row is None:
+                # evicted by another process since the shapes were loaded
+                return None
+            self._conn.execute("UPDATE plans SET last_used_at = ? WHERE id = ?", (time.time(), plan_id))
+            self._conn.commit()
+
+        stored_prompt, code, tools, steps, tokens, successes, failures = row
+        if failures > successes:
+            return None
+        return {
+            "id": plan_id,
+            "prompt": stored_prompt,
+            "code": json.loads(code),
+            "tools": json.loads(tools),
+            "steps": steps,
+            "tokens": tokens,
+            "similarity": round(similarity, 3),
+        }
+
+    def hint(self, plan: dict, prompt: str) -> str:
+        """
+        Return the hint injecting a plan in the task of a new prompt, its code adapted to the new prompt.
+        """
+        code = "\n\n".join(adapt_code(snippet, plan["prompt"], prompt) for snippet in plan["code"])
+        return (
+            f"Hint: a request of the same shape (\"{plan['prompt']}\") was answered successfully "
+            f"in {plan['steps']} step(s) with the code below. Unless it does not fit this request, follow "
+            "the same plan, adapted to this request, instead of designing a new one, then write the final answer.\n"
+            f"```python\n{code}\n```"
+        )
+
+    def record(self, prompt: str, steps: list[ActionStep], hinted_plan_id: int | None = None) -> int | None:
+        """
+        Store the plan of a successful run (its error-free tool-calling code), unless a plan of the same shape
+        (the plan the run was hinted with, else the best match above min_similarity) is at least as short,
+        in which case the shorter plan replaces the stored one. Returns the plan id, or None if the run used no tool.
+        The success of a run hinted with a plan is already accounted for (see report_outcome), it is not counted again.
+        """
+        code = [
+            step.code_action for step in steps
+            if step.error is None and step.code_action
+            and any(re.search(rf"\b{tool}\s*\(", step.code_action) for tool in PLAN_TOOLS)
+        ]
+        if not code:
+            return None
+        tools = [tool for snippet in code for tool in re.findall(rf"\b({'|'.join(PLAN_TOOLS)})\s*\(", snippet)]
+        tokens = sum(
+            step.token_usage.input_tokens + step.token_usage.output_tokens
+            for step in steps if step.token_usage is not None
+        )
+        shape = prompt_tokens(prompt)
+
+        with self._lock:
+            row = None
+            if hinted_plan_id is not None:
+                # the run adapted that plan, it has its shape by construction
+                plan_id = hinted_plan_id
+                row = self._conn.execute("SELECT steps, tokens FROM plans WHERE id = ?", (plan_id,)).fetchone()
+            if row is None:
+                plan_id, similarity = self._best_match(shape)
+                if plan_id is not None and similarity >= self.min_similarity:
+                    row = self._conn.execute("SELECT steps, tokens FROM plans WHERE id = ?", (plan_id,)).fetchone()
+            if row is not None:
+                # same shape: keep the shortest plan
+                stored_steps, stored_tokens = row
+                if (len(steps), tokens) < (stored_steps, stored_tokens):
+                    self._conn.execute(
+                        "UPDATE plans SET prompt = ?, code = ?, tools = ?, steps = ?, tokens = ? WHERE id = ?",
+                        (prompt, json.dumps(code), json.dumps(tools), len(steps), tokens, plan_id),
+                    )
+                    self._shapes[plan_id] = shape
+                successes = 0 if plan_id == hinted_plan_id else 1
+                self._conn.execute(
+                    "UPDATE plans SET successes = successes + ?, last_used_at = ? WHERE id = ?",
+                    (successes, time.time(), plan_id),
+                )
+            else:
+                plan_id = self._conn.execute(
+                    "INSERT INTO plans (prompt, code, tools, steps, tokens, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (prompt, json.dumps(code), json.dumps(tools), len(steps), tokens, time.time()),
+                ).lastrowid
+                self._shapes[plan_id] = shape
+                evicted = self._conn.execute(
+                    "SELECT id FROM plans ORDER BY last_used_at DESC LIMIT -1 OFFSET ?", (self.max_plans,)
+                ).fetchall()
+                for (evicted_id,) in evicted:
+                    self._conn.execute("DELETE FROM plans WHERE id = ?", (evicted_id,))
+                    self._shapes.pop(evicted_id, None)
+            self._conn.commit()
+        return plan_id
+
+    def report_outcome(self, plan_id: int, success: bool):
+        """
+        Account for the outcome of a run hinted with a plan.
+        """
+        column = "successes" if success else "failures"
+        with self._lock:
+            self._conn.execute(f"UPDATE plans SET {column} = {column} + 1 WHERE id = ?", (plan_id,))
+            self._conn.commit()
+
+    def track(self, stream: Iterable, prompt: str, plan: dict | None) -> Generator:
+        """
+        Wrap the event stream of a run: once the run is over, record its plan if it succeeded,
+        and account for the outcome of the plan it was hinted with.
+        """
+        steps = []
+        answered = False
+        try:
+            for event in stream:
+                if isinstance(event, ActionStep):
+                    steps.append(event)
+                elif isinstance(event, FinalAnswerStep):
+                    answered = True
+                yield event
+        finally:
+            success = answered and all(step.error is None for step in steps)
+            if plan is not None:
+                self.report_outcome(plan["id"], success)
+            if success:
+                self.record(prompt, steps, plan["id"] if plan is not None else None)
+
+_default_library = None
+
+def get_default_plan_library() -> PlanLibrary | None:
+    """
+    Return the plan library shared by all the agents of the process, or None if plans are disabled.
+    """
+    return _default_library
+
+def set_default_plan_library(library: PlanLibrary | None):
+    """
+    Enable (or disable, with None) the plan library shared by all the agents of the process, before creating agents.
+    """
+    global _default_library
+    _default_library = library
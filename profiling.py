@@ -0,0 +1,295 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Opt-in sampling profiler for agent runs.
+
+While a run is profiled, a background thread samples the Python stacks of all threads at a fixed
+interval (sys._current_frames, no tracing hooks, so the run itself is not slowed down). Each sample is
+tagged with the phase it belongs to, from its innermost recognized frame: model, tavily, local_search,
+python_executor, rendering (agent_ui), gradio or agent (smolagents orchestration).
+Profiles are saved as collapsed stacks (the input format of flamegraph.pl and speedscope) along with
+a per-phase breakdown.
+
+Samples cover the whole process: when other sessions are running at the same time, their work is
+sampled too, so profiles are best taken on a quiet server.
+
+Usage:
+    python profiling.py profiles/
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Generator, Iterable
+
+# phases, most specific first
+PHASES = ("model", "tavily", "local_search", "python_executor", "rendering", "gradio", "agent")
+
+# (phase, file path fragment, function names or None for all), checked from the innermost frame outwards
+_PHASE_RULES = (
+    ("model", "/resilience.py", {"generate", "generate_stream"}),
+    ("model", "/providers.py", None),
+    ("model", "/smolagents/models.py", None),
+    ("model", "/huggingface_hub/", None),
+    ("tavily", "/web_tools.py", None),
+    ("tavily", "/tavily/", None),
+    ("local_search", "/knowledge_store.py", None),
+    ("python_executor", "/smolagents/local_python_executor.py", None),
+    # unrecognized frames inside the profiled run stream belong to the agent, not to its consumer
+    ("agent", "/profiling.py", {"profile_stream"}),
+    ("rendering", "/agent_ui.py", None),
+    ("gradio", "/gradio/", None),
+    ("gradio", "/gradio_client/", None),
+    ("agent", "/smolagents/", None),
+)
+
+# innermost frames of threads waiting for work (event loops, idle pools)
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+
+def _classify(frame) -> tuple[str | None, bool]:
+    """
+    Return the phase of a stack (None if it is unrelated to agent runs) and whether its innermost frame is an idle wait.
+    """
+    idle = os.path.basename(frame.f_code.co_filename) in _IDLE_FILES
+    while frame is not None:
+        filename = frame.f_code.co_filename.replace(os.sep, "/")
+        for phase, fragment, functions in _PHASE_RULES:
+            if fragment in filename and (functions is None or frame.f_code.co_name in functions):
+                return phase, idle
+        frame = frame.f_back
+    return None, idle
+
+def _collapse(frame) -> str:
+    """
+    Return the stack of a frame as "file:function" entries from the outermost to the innermost, separated by ";".
+    """
+    names = []
+    while frame is not None:
+        names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class Profile:
+    """
+    The samples of a profiled run: collapsed stacks and per-phase counts.
+    """
+
+    def __init__(self, label: str, interval: float):
+        self.label = label
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks = Counter()
+        self.phases = Counter()
+        self.path = None
+
+    def breakdown(self) -> dict[str, dict[str, float]]:
+        """
+        Return the sampled time of each phase (thread-seconds) and its share of all the samples.
+        Threads working in parallel (e.g. parallel_map calls) all count, so shares are more telling than durations.
+        """
+        total = sum(self.phases.values()) or 1
+        return {
+            phase: {"seconds": round(self.phases[phase] * self.interval, 3), "share": round(self.phases[phase] / total, 3)}
+            for phase in PHASES if self.phases[phase]
+        }
+
+    def collapsed(self) -> str:
+        """
+        Return the collapsed stacks ("phase;frame;...;frame count" lines), rooted by phase.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "label": self.label,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "duration_s": round(self.duration, 3),
+            "interval_s": self.interval,
+            "samples": self.samples,
+            "phases": self.breakdown(),
+        }
+
+    def save(self, directory: str) -> str:
+        """
+        Write the collapsed stacks (.collapsed) and the summary (.json) of the profile, and return the collapsed stacks path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        name += "-" + re.sub(r"[^\w.-]", "_", self.label)[:40]
+        base = os.path.join(directory, name)
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        self.path = base + ".collapsed"
+        return self.path
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all the threads of the process at a fixed interval into a Profile.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.profile = None
+
+    def start(self, label: str):
+        self.profile = Profile(label, self.interval)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        self.profile.duration = time.time() - self.profile.started_at
+        return self.profile
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                phase, idle = _classify(frame)
+                # waiting threads only count when they wait for an outbound call (model, Tavily...)
+                if phase is None or (idle and phase in ("gradio", "agent")):
+                    continue
+                self.profile.samples += 1
+                self.profile.phases[phase] += 1
+                self.profile.stacks[f"{phase};{_collapse(frame)}"] += 1
+
+class RunProfiler:
+    """
+    Decides which agent runs are profiled (forced per request, or sampled at a given rate), profiles them
+    one at a time and keeps the latest profiles.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, interval: float = 0.01, output_dir: str = "profiles", keep: int = 20):
+        """
+        Construct the RunProfiler.
+
+        Args:
+            sample_rate: Share of the runs profiled without being requested (0 to only profile on request).
+            interval: Sampling interval (seconds).
+            output_dir: Directory where profiles are saved.
+            keep: Number of latest profiles kept in memory for the admin panel.
+        """
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.output_dir = output_dir
+        self._recent = deque(maxlen=keep)
+        self._active = threading.Lock()
+
+    def profile_stream(self, stream: Iterable, label: str, force: bool = False) -> Generator:
+        """
+        Wrap the event stream of an agent run, profiling the run if it is forced or sampled.
+        The profile spans the whole consumption of the stream, including what the consumer does between events
+        (e.g. UI rendering).
+        """
+        if not self.sampled(force):
+            yield from stream
+            return
+        # the sampler covers the whole process, overlapping profiles would sample each other's runs
+        if not self._active.acquire(blocking=False):
+            print(f"Run {label} not profiled: another run is being profiled.")
+            yield from stream
+            return
+
+        profiler = SamplingProfiler(self.interval)
+        profiler.start(label)
+        try:
+            yield from stream
+        finally:
+            profile = profiler.stop()
+            self._active.release()
+            try:
+                path = profile.save(self.output_dir)
+                print(f"Run {label} profiled ({profile.duration:.1f}s, {profile.samples} samples): {path}")
+            except OSError as e:
+                print(f"Could not save the profile of run {label}: {e}")
+            self._recent.append(profile)
+
+    def sampled(self, force: bool = False) -> bool:
+        """
+        Decide whether a run is profiled: always when forced, else at the sample rate.
+        """
+        return force or random.random() < self.sample_rate
+
+    def add(self, profile: Profile):
+        """
+        Keep a profile made elsewhere (e.g. in a worker process) with the latest profiles.
+        """
+        self._recent.append(profile)
+
+    def recent(self) -> list[Profile]:
+        """
+        Return the latest profiles, most recent first.
+        """
+        return list(reversed(self._recent))
+
+_default_profiler = RunProfiler()
+
+def get_default_run_profiler() -> RunProfiler:
+    """
+    Return the run profiler shared by all the agents of the process.
+    """
+    return _default_profiler
+
+def set_default_run_profiler(profiler: RunProfiler):
+    """
+    Replace the run profiler shared by all the agents of the process.
+    """
+    global _default_profiler
+    _default_profiler = profiler
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the per-phase breakdown of saved profiles.")
+    parser.add_argument("paths", nargs="+", help="profile .json files or directories of profiles")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json")))
+        else:
+            files.append(path)
+
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            summary = json.load(f)
+        phases = " | ".join(f"{phase} {stats['share']:.0%}" for phase, stats in summary["phases"].items())
+        print(f"{summary['started_at']} {summary['label']:<20} {summary['duration_s']:7.2f}s | {phases}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import threading
+import time
+
+from huggingface_hub import InferenceClient, model_info
+
+from resilience import LatencyTracker
+
+class ProviderManager:
+    """
+    Resolves and caches the inference providers serving each model, instead of letting every request
+    resolve them dynamically ("auto"), and picks one by measured latency when stats are available.
+    Providers are ranked by time to first token (streams and 1-token probes), the duration of full
+    generations depends on their length and is only reported.
+    Providers failing repeatedly are put aside for a while and another one is picked.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        error_threshold: int = 3,
+        cooldown: float = 300.0,
+        token: str | None = None,
+        resolve_timeout: float = 10.0,
+    ):
+        """
+        Construct the ProviderManager.
+
+        Args:
+            ttl: Seconds after which the provider mapping of a model is resolved again.
+            error_threshold: Consecutive errors after which a provider is put aside.
+            cooldown: Seconds during which a provider put aside is not selected.
+            token: Hugging Face token (defaults to the HF_API_KEY environment variable).
+            resolve_timeout: Maximum duration (seconds) of a Hub request resolving the providers of a model.
+        """
+        self.ttl = ttl
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.token = token or os.getenv("HF_API_KEY")
+        self.resolve_timeout = resolve_timeout
+        self._candidates: dict[str, tuple[float, list[str]]] = {}
+        self._selected: dict[str, str] = {}
+        # selections expire after ttl, the providers are then resolved and ranked again
+        self._selected_at: dict[str, float] = {}
+        self._resolving: set[str] = set()
+        # latency series per (model, provider, kind), kind being "ttft" or "generate"
+        self._latencies: dict[tuple[str, str, str], LatencyTracker] = {}
+        self._errors: dict[tuple[str, str], int] = {}
+        self._calls: dict[tuple[str, str], int] = {}
+        self._put_aside: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, model_id: str) -> list[str]:
+        """
+        Return the live providers serving a model, in the user's preference order (resolved once per ttl).
+        Falls back on "auto" if the mapping cannot be resolved.
+        """
+        with self._lock:
+            cached = self._candidates.get(model_id)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+
+        try:
+            info = model_info(
+                model_id, expand=["inferenceProviderMapping"], token=self.token, timeout=self.resolve_timeout)
+            providers = [
+                mapping.provider for mapping in info.inference_provider_mapping or []
+                if mapping.status == "live"
+            ] or ["auto"]
+        except Exception as e:
+            print(f"Could not resolve the providers of {model_id}: {e}")
+            # keep the previous resolution if any, but retry later
+            providers = cached[1] if cached is not None else ["auto"]
+
+        with self._lock:
+            self._candidates[model_id] = (time.monotonic(), providers)
+        return providers
+
+    def select(self, model_id: str) -> str:
+        """
+        Return the provider to use for a model: the fastest measured one, else the first in preference order,
+        skipping the providers put aside after repeated errors. The selection is kept for ttl seconds.
+        """
+        with self._lock:
+            selected = self._selected.get(model_id)
+            if self._is_valid(model_id, selected) and not self._is_expired(model_id):
+                return selected
+
+        candidates = self.candidates(model_id)
+        with self._lock:
+            available = [provider for provider in candidates if not self._is_put_aside(model_id, provider)] or candidates
+
+            def rank(item):
+                index, provider = item
+                tracker = self._latencies.get((model_id, provider, "ttft"))
+                median = tracker.percentile(0.5) if tracker is not None else None
+                return (median if median is not None else float("inf"), index)
+
+            previous = self._selected.get(model_id)
+            selected = min(enumerate(available), key=rank)[1]
+            self._selected[model_id] = selected
+            self._selected_at[model_id] = time.monotonic()
+        if selected != previous:
+            print(f"Provider {selected} selected for {model_id}.")
+        return selected
+
+    def current(self, model_id: str) -> str | None:
+        """
+        Return the provider selected for a model without blocking, or None if it is not known yet:
+        it is then resolved in the background (the Hub is never called from the request path).
+        An expired selection is still returned while it is resolved and ranked again in the background.
+        """
+        with self._lock:
+            selected = self._selected.get(model_id)
+            if not self._is_valid(model_id, selected):
+                selected = None
+            elif not self._is_expired(model_id):
+                return selected
+            if model_id not in self._resolving:
+                self._resolving.add(model_id)
+                threading.Thread(target=self._resolve, args=(model_id,), daemon=True).start()
+        return selected
+
+    def _is_valid(self, model_id: str, selected: str | None) -> bool:
+        return selected is not None and not self._is_put_aside(model_id, selected)
+
+    def _is_expired(self, model_id: str) -> bool:
+        return time.monotonic() - self._selected_at.get(model_id, 0.0) >= self.ttl
+
+    def selections(self) -> dict[str, str]:
+        """
+        Return the provider currently selected for each model.
+        """
+        with self._lock:
+            return {
+                model_id: provider for model_id, provider in self._selected.items()
+                if not self._is_put_aside(model_id, provider)
+            }
+
+    def pin(self, selections: dict[str, str]):
+        """
+        Adopt the providers selected by another manager (e.g. the one of the server process), unless put aside here.
+        """
+        with self._lock:
+            for model_id, provider in selections.items():
+                if not self._is_put_aside(model_id, provider):
+                    self._selected[model_id] = provider
+                    self._selected_at[model_id] = time.monotonic()
+
+    def _resolve(self, model_id: str):
+        try:
+            self.select(model_id)
+        finally:
+            with self._lock:
+                self._resolving.discard(model_id)
+
+    def _is_put_aside(self, model_id: str, provider: str) -> bool:
+        until = self._put_aside.get((model_id, provider))
+        return until is not None and time.monotonic() < until
+
+    def record_latency(self, model_id: str, provider: str, latency: float, kind: str = "ttft"):
+        """
+        Record the latency of a successful call: its time to first token ("ttft") for streams and probes,
+        or its full duration ("generate") for non-streamed generations.
+        """
+        key = (model_id, provider)
+        with self._lock:
+            tracker = self._latencies.get((model_id, provider, kind))
+            if tracker is None:
+                tracker = self._latencies[(model_id, provider, kind)] = LatencyTracker(min_samples=1)
+            tracker.record(latency)
+            self._calls[key] = self._calls.get(key, 0) + 1
+            self._errors[key] = 0
+
+    def report_error(self, model_id: str, provider: str) -> str | None:
+        """
+        Record a failed call and return the provider to use from now on (another one if this one keeps failing),
+        or None while it is being resolved in the background.
+        """
+        key = (model_id, provider)
+        with self._lock:
+            self._calls[key] = self._calls.get(key, 0) + 1
+            self._errors[key] = self._errors.get(key, 0) + 1
+            if self._errors[key] >= self.error_threshold:
+                self._errors[key] = 0
+                self._put_aside[key] = time.monotonic() + self.cooldown
+                if self._selected.get(model_id) == provider:
+                    del self._selected[model_id]
+                print(f"Provider {provider} put aside for {model_id} after repeated errors.")
+        return self.current(model_id)
+
+    def _probe(self, model_id: str, provider: str) -> float:
+        """
+        Send a minimal (1 token) chat completion to a provider and return its latency (a time to first token).
+        """
+        client = InferenceClient(provider=provider, token=self.token, timeout=30)
+        start_time = time.monotonic()
+        client.chat_completion(
+            messages=[{"role": "user", "content": "ping"}],
+            model=model_id,
+            max_tokens=1,
+        )
+        latency = time.monotonic() - start_time
+        self.record_latency(model_id, provider, latency)
+        return latency
+
+    def benchmark(self, model_id: str, rounds: int = 2) -> dict[str, float | None]:
+        """
+        Measure the latency of every candidate provider of a model with minimal requests, then re-select.
+        Returns the best latency of each provider (None if it failed).
+        """
+        results = {}
+        for provider in self.candidates(model_id):
+            latencies = []
+            for _ in range(rounds):
+                try:
+                    latencies.append(self._probe(model_id, provider))
+                except Exception as e:
+                    print(f"Provider {provider} failed to answer for {model_id}: {e}")
+                    self.report_error(model_id, provider)
+                    break
+            results[provider] = min(latencies) if latencies else None
+
+        with self._lock:
+            self._selected.pop(model_id, None)
+        self.select(model_id)
+        return results
+
+    def warm_up(self, model_id: str, benchmark: bool = False):
+        """
+        Resolve the providers of a model and pre-warm the connection (DNS, TLS, routing) to the selected one,
+        benchmarking all the candidates first if requested.
+        """
+        if benchmark:
+            self.benchmark(model_id)
+        provider = self.select(model_id)
+        try:
+            self._probe(model_id, provider)
+        except Exception as e:
+            print(f"Could not warm up provider {provider} for {model_id}: {e}")
+            self.report_error(model_id, provider)
+
+    def stats(self) -> dict[str, dict[str, dict]]:
+        """
+        Return, for each model, the selected provider and the latency stats of each provider used.
+        """
+        with self._lock:
+            stats = {}
+            for (model_id, provider), calls in self._calls.items():
+                ttft = self._latencies.get((model_id, provider, "ttft"), LatencyTracker())
+                generate = self._latencies.get((model_id, provider, "generate"), LatencyTracker())
+                model_stats = stats.setdefault(model_id, {"selected": self._selected.get(model_id), "providers": {}})
+                model_stats["providers"][provider] = {
+                    "calls": calls,
+                    "ttft_p50": ttft.percentile(0.5),
+                    "ttft_p95": ttft.percentile(0.95),
+                    "generate_p50": generate.percentile(0.5),
+                    "put_aside": self._is_put_aside(model_id, provider),
+                }
+            return stats
+
+_default_manager = ProviderManager()
+
+def get_default_provider_manager() -> ProviderManager:
+    """
+    Return the provider manager shared by all the models of the process.
+    """
+    return _default_manager
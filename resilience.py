@@ -0,0 +1,346 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+from smolagents import InferenceClientModel
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is refused because the circuit breaker of its endpoint is open.
+    """
+
+class CircuitBreaker:
+    """
+    A circuit breaker: opens after consecutive failures so that calls fail fast, then lets a single
+    probe call through after a cool-down (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Return whether a call may go through (in half-open state, only one probe at a time).
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Give back the slot of a call which ended without outcome (e.g. abandoned by its caller):
+        in half-open state, the next call becomes the probe.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened_at = time.monotonic() - self.reset_timeout
+
+class LatencyTracker:
+    """
+    Tracks the latencies of the last calls of an endpoint to compute percentiles.
+    """
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Return the q-th percentile (0-1) of the tracked latencies, or None without enough samples.
+        """
+        with self._lock:
+            if not self._latencies or len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+class ResponseCache:
+    """
+    A small LRU cache of the last successful responses, used as fallback when an endpoint fails.
+    """
+
+    def __init__(self, size: int = 512, ttl: float = 24 * 3600.0):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+# calls run on a shared pool so that the caller can stop waiting for them (timeout) or race them (hedging)
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="resilience")
+
+class Endpoint:
+    """
+    Resilience layer around the calls to an outbound endpoint: timeout, hedged requests,
+    circuit breaker and a cache of the last responses to fall back on.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 60.0,
+        hedge_percentile: float | None = 0.95,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        """
+        Construct the Endpoint.
+
+        Args:
+            name: Endpoint name, for reporting.
+            timeout: Maximum duration of a call (seconds).
+            hedge_percentile: Latency percentile after which a hedged duplicate request is sent (None to never hedge).
+            failure_threshold: Consecutive failures opening the circuit breaker.
+            reset_timeout: Seconds before an open circuit breaker lets a probe call through.
+        """
+        self.name = name
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latencies = LatencyTracker()
+        self.cache = ResponseCache()
+        self.stats = {"calls": 0, "failures": 0, "hedged": 0, "rejected": 0, "fallbacks": 0}
+
+    def hedge_delay(self) -> float | None:
+        """
+        Return the delay after which a hedged request is sent, or None if hedging is not possible yet.
+        """
+        if self.hedge_percentile is None:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    def call(self, fn: Callable, *args, hedge: bool = False, **kwargs):
+        """
+        Call fn(*args, **kwargs) through the endpoint and return (result, requests), requests being
+        the number of requests actually sent (2 when hedged).
+        Only idempotent calls may be hedged: a duplicate request is then sent if the first one is slower
+        than the hedge percentile, and the first response wins.
+        Raises CircuitOpenError without calling fn if the circuit breaker is open.
+        """
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit breaker open)")
+
+        self.stats["calls"] += 1
+        start_time = time.monotonic()
+        futures = [_executor.submit(fn, *args, **kwargs)]
+        hedge_delay = self.hedge_delay() if hedge else None
+        requests = 1
+        try:
+            if hedge_delay is not None and hedge_delay < self.timeout:
+                done, _ = wait(futures, timeout=hedge_delay)
+                if not done:
+                    self.stats["hedged"] += 1
+                    requests = 2
+                    futures.append(_executor.submit(fn, *args, **kwargs))
+
+            error = None
+            while futures:
+                remaining = self.timeout - (time.monotonic() - start_time)
+                done, _ = wait(futures, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{self.name} did not answer within {self.timeout}s")
+                for future in done:
+                    futures.remove(future)
+                    if future.exception() is None:
+                        result = future.result()
+                        self.latencies.record(time.monotonic() - start_time)
+                        self.breaker.record_success()
+                        return result, requests
+                    error = future.exception()
+            raise error
+        except Exception:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+
+    def call_with_fallback(self, cache_key, fn: Callable, *args, hedge: bool = False, **kwargs):
+        """
+        Like call, but cache successful results under cache_key and return (cached_result, 0) when the call fails.
+        The error is re-raised if nothing is cached.
+        """
+        try:
+            result, requests = self.call(fn, *args, hedge=hedge, **kwargs)
+        except Exception:
+            cached = self.cache.get(cache_key)
+            if cached is None:
+                raise
+            self.stats["fallbacks"] += 1
+            return cached, 0
+        self.cache.put(cache_key, result)
+        return result, requests
+
+_endpoints: dict[str, Endpoint] = {}
+_endpoints_lock = threading.Lock()
+
+def get_endpoint(name: str, **kwargs) -> Endpoint:
+    """
+    Return the endpoint of the given name, shared by the whole process (created with kwargs on first use).
+    """
+    with _endpoints_lock:
+        endpoint = _endpoints.get(name)
+        if endpoint is None:
+            endpoint = _endpoints[name] = Endpoint(name, **kwargs)
+        return endpoint
+
+def get_endpoint_stats() -> dict[str, dict]:
+    """
+    Return the stats, breaker state and latency percentiles of all the endpoints.
+    """
+    with _endpoints_lock:
+        endpoints = list(_endpoints.values())
+    return {
+        endpoint.name: {
+            **endpoint.stats,
+            "state": endpoint.breaker.state,
+            "p50": endpoint.latencies.percentile(0.5),
+            "p95": endpoint.latencies.percentile(0.95),
+        }
+        for endpoint in endpoints
+    }
+
+class ResilientInferenceClientModel(InferenceClientModel):
+    """
+    An InferenceClientModel whose calls go through a circuit breaker. With hedge, its non-streamed calls
+    are hedged: they are idempotent, but a duplicate generation is paid inference, so only models on the
+    critical path of a run should opt in.
+    With a provider manager, the provider is picked by the manager instead of being resolved on every
+    request, and switched when the manager re-evaluates it after errors. Until the manager knows the
+    provider of the model, the provider given at construction is used.
+    """
+
+    def __init__(self, *args, provider_manager=None, hedge: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.endpoint = get_endpoint(f"inference:{self.model_id}", timeout=self.client_kwargs["timeout"])
+        self.provider_manager = provider_manager
+        self.hedge = hedge
+        self.default_provider = self.client_kwargs["provider"]
+
+    def _refresh_provider(self):
+        if self.provider_manager is not None:
+            self._use_provider(self.provider_manager.current(self.model_id) or self.default_provider)
+
+    def _use_provider(self, provider: str):
+        if provider != self.client_kwargs["provider"]:
+            self.client_kwargs["provider"] = provider
+            self.client = self.create_client()
+
+    def _record_success(self, provider: str, latency: float, kind: str):
+        if self.provider_manager is not None:
+            self.provider_manager.record_latency(self.model_id, provider, latency, kind)
+
+    def _record_error(self, provider: str):
+        if self.provider_manager is not None:
+            self._use_provider(self.provider_manager.report_error(self.model_id, provider) or self.default_provider)
+
+    def generate(self, *args, **kwargs):
+        self._refresh_provider()
+        provider = self.client_kwargs["provider"]
+        start_time = time.monotonic()
+        try:
+            result, _ = self.endpoint.call(super().generate, *args, hedge=self.hedge, **kwargs)
+        except Exception:
+            self._record_error(provider)
+            raise
+        self._record_success(provider, time.monotonic() - start_time, "generate")
+        return result
+
+    def generate_stream(self, *args, **kwargs):
+        if not self.endpoint.breaker.allow():
+            self.endpoint.stats["rejected"] += 1
+            raise CircuitOpenError(f"{self.endpoint.name} is unavailable (circuit breaker open)")
+        self.endpoint.stats["calls"] += 1
+        self._refresh_provider()
+        provider = self.client_kwargs["provider"]
+        start_time = time.monotonic()
+        first = True
+        finished = False
+        try:
+            for delta in super().generate_stream(*args, **kwargs):
+                if first:
+                    # streams are tracked by their time to first token, apart from the full generations the
+                    # endpoint latencies (hedge delay) are computed from
+                    self._record_success(provider, time.monotonic() - start_time, "ttft")
+                    first = False
+                yield delta
+            finished = True
+        except Exception:
+            finished = True
+            self.endpoint.stats["failures"] += 1
+            self.endpoint.breaker.record_failure()
+            self._record_error(provider)
+            raise
+        finally:
+            # a stream closed early by its consumer (GeneratorExit) succeeded if it produced tokens, an interrupted
+            # one says nothing about the endpoint and must not hold the half-open probe
+            if not finished:
+                if first:
+                    self.endpoint.breaker.release()
+                else:
+                    self.endpoint.breaker.record_success()
+        self.endpoint.breaker.record_success()
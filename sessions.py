@@ -0,0 +1,346 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import io
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Callable
+
+from smolagents.utils import AgentError
+
+from budget import BudgetGovernor
+
+def _rebuild_agent_error(cls, message):
+    """
+    Rebuild an AgentError without going through its constructor (which requires a logger).
+    """
+    error = Exception.__new__(cls)
+    Exception.__init__(error, message)
+    error.message = message
+    return error
+
+class _SessionPickler(pickle.Pickler):
+    """
+    Pickler aware of the smolagents objects that cannot be pickled as-is.
+    """
+    def reducer_override(self, obj):
+        if isinstance(obj, AgentError):
+            return _rebuild_agent_error, (type(obj), obj.message)
+        return NotImplemented
+
+def dumps(obj) -> bytes:
+    """
+    Pickle an object that may hold agent memory steps (e.g. a session record).
+    """
+    buffer = io.BytesIO()
+    _SessionPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+class SessionBusy(Exception):
+    """
+    Raised when a session is requested for exclusive use while it is already in use.
+    """
+
+class SessionStore:
+    """
+    A SQLite-backed store holding hibernated sessions as compressed pickles.
+    """
+
+    def __init__(self, path: str = "sessions.db"):
+        """
+        Construct the SessionStore.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, "
+            "updated_at REAL NOT NULL, "
+            "data BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def save(self, session_id: str, record: dict):
+        """
+        Serialize and persist a session record, replacing any previous one.
+        """
+        data = zlib.compress(dumps(record))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, updated_at, data) VALUES (?, ?, ?)",
+                (session_id, time.time(), data),
+            )
+            self._conn.commit()
+
+    def load(self, session_id: str) -> dict | None:
+        """
+        Load a session record, or None if the session was never hibernated.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def delete(self, session_id: str):
+        """
+        Remove a session record from the store.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def purge(self, max_age: float):
+        """
+        Remove the session records that were not updated for more than max_age seconds.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age,))
+            self._conn.commit()
+
+class Session:
+    """
+    An active user session: a dedicated agent and the two chat histories of the UI.
+    """
+
+    def __init__(self, session_id: str, agent):
+        self.session_id = session_id
+        self.agent = agent
+        self.verbose_messages = []
+        self.quiet_messages = []
+        self.last_active = time.monotonic()
+        self.busy = 0
+
+    def to_record(self) -> dict:
+        """
+        Export the session state as a plain record.
+        """
+        return {
+            "memory_steps": self.agent.get_memory_steps(),
+            "advanced_mode": getattr(self.agent, "advanced_mode", False),
+            "verbose_messages": self.verbose_messages,
+            "quiet_messages": self.quiet_messages,
+        }
+
+    def load_record(self, record: dict):
+        """
+        Restore the session state from a record produced by to_record.
+        """
+        self.agent.set_memory_steps(record.get("memory_steps", []))
+        if record.get("advanced_mode"):
+            self.agent.enable_advanced_mode(True)
+        self.verbose_messages = record.get("verbose_messages", [])
+        self.quiet_messages = record.get("quiet_messages", [])
+
+class SessionManager:
+    """
+    Keeps one agent per active session in memory, hibernates idle sessions to a
+    SessionStore and rehydrates them lazily on their next message.
+    """
+
+    def __init__(
+        self,
+        agent_factory: Callable,
+        store: SessionStore | None = None,
+        idle_timeout: float = 900.0,
+        sweep_interval: float = 60.0,
+        retention: float = 30 * 24 * 3600.0,
+        governor: BudgetGovernor | None = None,
+    ):
+        """
+        Construct the SessionManager.
+
+        Args:
+            agent_factory: Callable building a fresh agent for a new session, given the session id.
+            store: Where idle sessions are hibernated. Without a store, idle sessions are simply dropped.
+            idle_timeout: Seconds of inactivity after which a session is evicted from memory.
+            sweep_interval: Seconds between two idle session sweeps (0 disables the background sweeper).
+            retention: Seconds after which hibernated sessions are purged from the store.
+            governor: Budget governor whose idle session budgets are pruned along with the idle sessions.
+        """
+        self.agent_factory = agent_factory
+        self.store = store
+        self.governor = governor
+        self.idle_timeout = idle_timeout
+        self.retention = retention
+        self._sessions: dict[str, Session] = {}
+        # sessions being built or hibernated, so that the slow part runs outside the manager lock
+        self._pending: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+        if sweep_interval > 0:
+            self._stop = threading.Event()
+            self._sweeper = threading.Thread(target=self._sweep_loop, args=(sweep_interval,), daemon=True)
+            self._sweeper.start()
+
+    def get(self, session_id: str) -> Session:
+        """
+        Return the session for the given id, rehydrating it from the store if needed.
+        Building an agent is slow: it happens outside the manager lock, only the callers of the same session wait for it.
+        """
+        while True:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is not None:
+                    session.last_active = time.monotonic()
+                    return session
+                pending = self._pending.get(session_id)
+                if pending is None:
+                    pending = self._pending[session_id] = threading.Event()
+                    break
+            # the session is being built or hibernated by another thread
+            pending.wait()
+
+        try:
+            session = Session(session_id, self.agent_factory(session_id))
+            record = self.store.load(session_id) if self.store is not None else None
+            if record is not None:
+                session.load_record(record)
+                print(f"Session {session_id} has been rehydrated ({len(session.agent.get_memory_steps())} memory steps).")
+            with self._lock:
+                self._sessions[session_id] = session
+        finally:
+            with self._lock:
+                del self._pending[session_id]
+            pending.set()
+        return session
+
+    @contextmanager
+    def use(self, session_id: str, exclusive: bool = False):
+        """
+        Context manager marking a session as busy so that it cannot be evicted while in use.
+        With exclusive, raises SessionBusy instead if the session is already in use (checked and reserved atomically).
+        """
+        while True:
+            session = self.get(session_id)
+            with self._lock:
+                # the session may have been evicted between get() and here
+                if self._sessions.get(session_id) is session:
+                    if exclusive and session.busy:
+                        raise SessionBusy(f"Session {session_id} is already running a task.")
+                    session.busy += 1
+                    break
+        try:
+            yield session
+        finally:
+            with self._lock:
+                session.busy -= 1
+                session.last_active = time.monotonic()
+
+    def reset(self, session_id: str):
+        """
+        Reset a session: clear its agent memory and histories, in memory and in the store.
+        A session being built or hibernated is reset once that is over, so that its old record is not written back.
+        """
+        while True:
+            with self._lock:
+                pending = self._pending.get(session_id)
+                if pending is None:
+                    session = self._sessions.get(session_id)
+                    pending = self._pending[session_id] = threading.Event()
+                    break
+            pending.wait()
+
+        try:
+            if session is not None:
+                session.agent.reset()
+                session.verbose_messages = []
+                session.quiet_messages = []
+            if self.store is not None:
+                self.store.delete(session_id)
+        finally:
+            with self._lock:
+                del self._pending[session_id]
+            pending.set()
+
+    def evict_idle(self) -> int:
+        """
+        Hibernate the sessions idle for more than idle_timeout seconds and return how many were evicted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                session for session in self._sessions.values()
+                if not session.busy and now - session.last_active > self.idle_timeout
+                and session.session_id not in self._pending
+            ]
+            # a concurrent get() waits for the record to be saved rather than rehydrating a stale one
+            pending = {}
+            for session in idle:
+                del self._sessions[session.session_id]
+                pending[session.session_id] = self._pending[session.session_id] = threading.Event()
+
+        evicted = 0
+        for session in idle:
+            try:
+                if self.store is not None:
+                    self.store.save(session.session_id, session.to_record())
+                evicted += 1
+            except Exception as e:
+                print(f"Session {session.session_id} could not be hibernated, it stays in memory: {e}")
+                with self._lock:
+                    self._sessions[session.session_id] = session
+            finally:
+                with self._lock:
+                    del self._pending[session.session_id]
+                pending[session.session_id].set()
+
+        if evicted:
+            print(f"{evicted} idle session(s) have been hibernated, {len(self._sessions)} still active.")
+        return evicted
+
+    def hibernate_all(self):
+        """
+        Persist every active session to the store, e.g. before a shutdown or a rolling deploy.
+        """
+        if self.store is None:
+            return
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            self.store.save(session.session_id, session.to_record())
+
+    def close(self):
+        """
+        Stop the background sweeper and persist all active sessions.
+        """
+        if hasattr(self, "_stop"):
+            self._stop.set()
+        self.hibernate_all()
+
+    def _sweep_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.evict_idle()
+                if self.store is not None:
+                    self.store.purge(self.retention)
+                if self.governor is not None:
+                    self.governor.prune(self.idle_timeout)
+            except Exception as e:
+                print(f"Session sweep failed: {e}")
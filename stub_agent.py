@@ -0,0 +1,147 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import time
+
+from smolagents.agent_types import AgentText
+from smolagents.memory import ActionStep, FinalAnswerStep, TaskStep, ToolCall
+from smolagents.models import ChatMessageStreamDelta
+from smolagents.monitoring import Timing, TokenUsage
+
+class StubAgent:
+    """
+    A stand-in for SmolAlbert that emits realistic stream deltas and memory steps without
+    calling any model or web API, with configurable model and tool latencies.
+    Used for benchmarks and load tests.
+    """
+
+    advanced_mode = False
+
+    def __init__(
+        self,
+        session_id: str | None = None,
+        steps: int = 3,
+        tokens_per_step: int = 80,
+        token_latency: float = 0.02,
+        tool_latency: float = 0.5,
+        answer_tokens: int = 120,
+        tool_cpu: float = 0.0,
+    ):
+        """
+        Construct the StubAgent.
+
+        Args:
+            session_id: Ignored, for compatibility with SmolAlbert.
+            steps: Number of action steps per run, the last one calling final_answer.
+            tokens_per_step: Number of streamed tokens of the model output of intermediate steps.
+            token_latency: Delay between two streamed tokens (seconds).
+            tool_latency: Duration of the simulated tool calls of intermediate steps (seconds).
+            answer_tokens: Number of streamed tokens of the final answer.
+            tool_cpu: CPU time burnt in pure Python (holding the GIL) by the tool calls of intermediate steps,
+                like a CPU-heavy generated snippet (seconds).
+        """
+        self.session_id = session_id
+        self.steps = steps
+        self.tokens_per_step = tokens_per_step
+        self.token_latency = token_latency
+        self.tool_latency = tool_latency
+        self.answer_tokens = answer_tokens
+        self.tool_cpu = tool_cpu
+        self.memory_steps = []
+        self.credits_used = 0
+
+    def _stream(self, text: str):
+        """
+        Stream a text as word-sized deltas.
+        """
+        words = text.split(" ")
+        for index, word in enumerate(words):
+            time.sleep(self.token_latency)
+            yield ChatMessageStreamDelta(content=word if index == 0 else " " + word)
+
+    def run(self, task: str, additional_args: dict | None = None):
+        """
+        Simulate an agent run, yielding stream deltas then memory steps like CodeAgent.run(stream=True).
+        """
+        self.memory_steps.append(TaskStep(task=task))
+        step_offset = sum(isinstance(step, ActionStep) for step in self.memory_steps)
+
+        for index in range(1, self.steps + 1):
+            step_number = step_offset + index
+            start_time = time.time()
+            is_final = index == self.steps
+            if is_final:
+                answer = " ".join(f"answer{n}" for n in range(self.answer_tokens))
+                code = f'final_answer("""{answer}""")'
+                thought = "Thought: I now have everything needed to answer."
+            else:
+                filler = " ".join(f"token{n}" for n in range(self.tokens_per_step))
+                code = f'results = tavily_search(query="{task} {index}")\nprint(results)'
+                thought = f"Thought: {filler}"
+            model_output = f"{thought}\n```python\n{code}\n```"
+
+            yield from self._stream(model_output)
+
+            if is_final:
+                observations = None
+            else:
+                time.sleep(self.tool_latency)
+                # in long C calls that hold the GIL without switching, like sorting or summing big data
+                deadline = time.thread_time() + self.tool_cpu
+                while time.thread_time() < deadline:
+                    sum(range(2_000_000))
+                self.credits_used += 1
+                observations = f"Execution logs:\n{{'query': '{task}', 'results': [...]}}"
+
+            step = ActionStep(
+                step_number=step_number,
+                timing=Timing(start_time=start_time, end_time=time.time()),
+                model_output=model_output,
+                code_action=code,
+                tool_calls=[ToolCall(name="python_interpreter", arguments=code, id=f"call_{step_number}")],
+                observations=observations,
+                token_usage=TokenUsage(input_tokens=1000 * index, output_tokens=len(model_output.split(" "))),
+                is_final_answer=is_final,
+            )
+            self.memory_steps.append(step)
+            yield step
+
+        yield FinalAnswerStep(output=AgentText(answer))
+
+    def enable_advanced_mode(self, enable: bool):
+        self.advanced_mode = enable
+
+    def reset(self):
+        self.memory_steps = []
+
+    def get_memory_steps(self) -> list:
+        return list(self.memory_steps)
+
+    def set_memory_steps(self, steps: list):
+        self.memory_steps = list(steps)
+
+    def get_spent_credits(self) -> int:
+        return self.credits_used
+
+    @staticmethod
+    def get_search_credits() -> str:
+        return "0/0"
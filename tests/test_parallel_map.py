@@ -0,0 +1,92 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import time
+
+from smolagents import Tool
+
+from other_tools import ParallelMapTool
+
+class SleepTool(Tool):
+    """
+    A stub tool sleeping for the given delay before echoing its value.
+    """
+    name = "sleep"
+    description = "Sleep for the given delay, then return the value."
+    inputs = {
+        "value": {"type": "string", "description": "The value to return."},
+        "delay": {"type": "number", "description": "The delay (seconds)."},
+    }
+    output_type = "string"
+
+    def forward(self, value: str, delay: float):
+        time.sleep(delay)
+        return value
+
+class FailTool(Tool):
+    """
+    A stub tool always raising.
+    """
+    name = "fail"
+    description = "Always fail."
+    inputs = {"message": {"type": "string", "description": "The error message."}}
+    output_type = "string"
+
+    def forward(self, message: str):
+        raise RuntimeError(message)
+
+def sleep_call(value: str, delay: float) -> dict:
+    return {"tool": "sleep", "args": {"value": value, "delay": delay}}
+
+def test_results_keep_call_order():
+    tool = ParallelMapTool([SleepTool()])
+    results = tool.forward([sleep_call("a", 0.3), sleep_call("b", 0.0), sleep_call("c", 0.1)])
+    assert results == ["a", "b", "c"]
+
+def test_failing_call_is_isolated():
+    tool = ParallelMapTool([SleepTool(), FailTool()])
+    results = tool.forward([
+        sleep_call("a", 0.05),
+        {"tool": "fail", "args": {"message": "boom"}},
+        {"tool": "missing", "args": {}},
+        sleep_call("d", 0.05),
+    ])
+    assert results[0] == "a" and results[3] == "d"
+    assert results[1].startswith("Error") and "boom" in results[1]
+    assert results[2].startswith("Error") and "unknown tool" in results[2]
+
+def test_call_timeout_fires():
+    tool = ParallelMapTool([SleepTool()], timeout=0.2)
+    start = time.monotonic()
+    results = tool.forward([sleep_call("slow", 2.0), sleep_call("fast", 0.0)])
+    elapsed = time.monotonic() - start
+    assert results[0].startswith("Error") and "timed out" in results[0]
+    assert results[1] == "fast"
+    assert elapsed < 1.0
+
+def test_wall_time_is_the_slowest_call():
+    tool = ParallelMapTool([SleepTool()], max_workers=4)
+    delays = [0.4, 0.2, 0.3, 0.1]
+    start = time.monotonic()
+    tool.forward([sleep_call(str(i), delay) for i, delay in enumerate(delays)])
+    elapsed = time.monotonic() - start
+    assert max(delays) <= elapsed < sum(delays)
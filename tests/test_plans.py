@@ -0,0 +1,81 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from types import SimpleNamespace
+
+import pytest
+
+from plans import PlanLibrary, adapt_code, prompt_tokens, shape_similarity
+
+def similarity(prompt: str, other_prompt: str) -> float:
+    return shape_similarity(prompt_tokens(prompt), prompt_tokens(other_prompt))
+
+def search_step(query: str, tokens: int = 100):
+    return SimpleNamespace(
+        error=None,
+        code_action=f'results = tavily_search(query="{query}")\nprint(results)',
+        token_usage=SimpleNamespace(input_tokens=tokens, output_tokens=0),
+    )
+
+def answer_step():
+    return SimpleNamespace(error=None, code_action='final_answer("done")', token_usage=None)
+
+@pytest.fixture
+def library(tmp_path):
+    return PlanLibrary(str(tmp_path / "plans.db"))
+
+@pytest.mark.parametrize("prompt, other_prompt", [
+    ("price of bitcoin", "price of gold"),
+    ("What is the latest news about Tesla?", "What is the latest news about Nvidia?"),
+])
+def test_same_shape_prompts_match(library, prompt, other_prompt):
+    assert similarity(prompt, other_prompt) >= library.min_similarity
+
+    library.record(prompt, [search_step(prompt), answer_step()])
+    plan = library.match(other_prompt)
+    assert plan is not None and plan["prompt"] == prompt
+
+def test_unrelated_prompts_do_not_match(library):
+    assert similarity("price of bitcoin", "history of the roman empire") < library.min_similarity
+    library.record("price of bitcoin", [search_step("price of bitcoin")])
+    assert library.match("explain quantum computing") is None
+
+def test_hinted_runs_update_their_plan(library):
+    subjects = ["Tesla", "Apple", "Nvidia", "Intel", "AMD"]
+    first = f"What is the latest news about {subjects[0]}?"
+    plan_id = library.record(first, [search_step(first), search_step(first), answer_step()])
+
+    for subject in subjects[1:]:
+        prompt = f"What is the latest news about {subject}?"
+        plan = library.match(prompt)
+        assert plan["id"] == plan_id
+        # a shorter run of the same shape replaces the stored plan, its success is only counted once
+        library.report_outcome(plan_id, True)
+        assert library.record(prompt, [search_step(prompt), answer_step()], plan_id) == plan_id
+
+    rows = library._conn.execute("SELECT prompt, steps, successes FROM plans").fetchall()
+    assert rows == [("What is the latest news about Apple?", 2, len(subjects))]
+
+def test_adapt_code_replaces_whole_words_in_literals():
+    code = 'rust_news = tavily_search(query="latest news about Rust")\nprint("Rustacean", rust_news)'
+    adapted = adapt_code(code, "latest news about Rust", "latest news about Go")
+    assert adapted == 'rust_news = tavily_search(query="latest news about Go")\nprint("Rustacean", rust_news)'
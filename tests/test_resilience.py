@@ -0,0 +1,169 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import threading
+import time
+
+import pytest
+from smolagents import InferenceClientModel
+
+from resilience import CircuitBreaker, CircuitOpenError, Endpoint, ResilientInferenceClientModel
+
+def fail(*args, **kwargs):
+    raise ConnectionError("endpoint down")
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_breaker_recovers_through_half_open():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    open_breaker(breaker)
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # a single probe at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+def test_breaker_reopens_when_probe_fails():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_hedge_fires_after_percentile_and_fastest_wins():
+    endpoint = Endpoint("test_hedge", timeout=5.0, hedge_percentile=0.95)
+    for _ in range(endpoint.latencies.min_samples):
+        endpoint.latencies.record(0.05)
+
+    calls = []
+    lock = threading.Lock()
+
+    def slow_then_fast():
+        with lock:
+            calls.append(time.monotonic())
+            first = len(calls) == 1
+        if first:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    result, requests = endpoint.call(slow_then_fast, hedge=True)
+    elapsed = time.monotonic() - start
+
+    assert (result, requests) == ("fast", 2)
+    assert calls[1] - calls[0] >= 0.05
+    assert elapsed < 0.5
+    assert endpoint.stats["hedged"] == 1
+
+def test_no_hedge_without_enough_samples():
+    endpoint = Endpoint("test_no_hedge", timeout=5.0)
+    result, requests = endpoint.call(lambda: "ok", hedge=True)
+    assert (result, requests) == ("ok", 1)
+
+def test_call_with_fallback_prefers_fresh_results():
+    endpoint = Endpoint("test_fallback", timeout=5.0)
+    assert endpoint.call_with_fallback("key", lambda: "first") == ("first", 1)
+    assert endpoint.call_with_fallback("key", lambda: "second") == ("second", 1)
+    # the last successful result is served when the call fails
+    assert endpoint.call_with_fallback("key", fail) == ("second", 0)
+    assert endpoint.stats["fallbacks"] == 1
+    # nothing cached under another key: the error goes through
+    with pytest.raises(ConnectionError):
+        endpoint.call_with_fallback("other", fail)
+
+def test_cache_serves_during_outage():
+    endpoint = Endpoint("test_outage", timeout=5.0, failure_threshold=2, reset_timeout=60.0)
+    endpoint.call_with_fallback("key", lambda: "cached")
+    for _ in range(2):
+        assert endpoint.call_with_fallback("key", fail) == ("cached", 0)
+    assert endpoint.breaker.state == "open"
+
+    # the circuit is open: the endpoint is not called anymore, the cache still answers
+    called = []
+    assert endpoint.call_with_fallback("key", lambda: called.append(True)) == ("cached", 0)
+    assert not called
+    with pytest.raises(CircuitOpenError):
+        endpoint.call_with_fallback("other", lambda: "fresh")
+
+def half_open_model(monkeypatch, stream) -> ResilientInferenceClientModel:
+    monkeypatch.setattr(InferenceClientModel, "generate_stream", stream)
+    model = ResilientInferenceClientModel(model_id="test/stream-model")
+    model.endpoint.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    open_breaker(model.endpoint.breaker)
+    time.sleep(0.06)
+    return model
+
+def test_stream_closed_by_consumer_closes_half_open_breaker(monkeypatch):
+    def stream(self, *args, **kwargs):
+        yield "first"
+        yield "second"
+
+    model = half_open_model(monkeypatch, stream)
+    deltas = model.generate_stream([])
+    assert next(deltas) == "first"
+    assert model.endpoint.breaker.state == "half_open"
+    # the consumer stops early (GeneratorExit): the endpoint did answer
+    deltas.close()
+    assert model.endpoint.breaker.state == "closed"
+
+def test_interrupted_stream_releases_half_open_probe(monkeypatch):
+    def stream(self, *args, **kwargs):
+        raise KeyboardInterrupt
+        yield
+
+    model = half_open_model(monkeypatch, stream)
+    with pytest.raises(KeyboardInterrupt):
+        next(model.generate_stream([]))
+    # no outcome: the probe slot is given back to the next call
+    assert model.endpoint.breaker.state == "open"
+    assert model.endpoint.breaker.allow()
+
+@pytest.mark.parametrize("hedge, expected_hedged", [(False, 0), (True, 1)])
+def test_model_hedging_is_opt_in(monkeypatch, hedge, expected_hedged):
+    calls = []
+
+    def generate(self, *args, **kwargs):
+        calls.append(time.monotonic())
+        time.sleep(0.3 if len(calls) == 1 else 0.0)
+        return "answer"
+
+    monkeypatch.setattr(InferenceClientModel, "generate", generate)
+    model = ResilientInferenceClientModel(model_id=f"test/hedge-model-{hedge}", hedge=hedge)
+    for _ in range(model.endpoint.latencies.min_samples):
+        model.endpoint.latencies.record(0.05)
+
+    assert model.generate([]) == "answer"
+    assert model.endpoint.stats["hedged"] == expected_hedged
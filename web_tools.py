@@ -21,15 +21,95 @@
 # THE SOFTWARE.
 
 import os
+import time
 import requests
 
 from smolagents import Tool
 from tavily import TavilyClient
 
+from budget import BudgetExceeded, BudgetGovernor
+from condense import Condenser
+from knowledge_store import KnowledgeStore
+from resilience import get_endpoint
+
 class TavilyBaseClient:
     __api_key = os.getenv("TAVILY_API_KEY")
     _tavily_client = TavilyClient(api_key=__api_key)
 
+    # Tavily credits spent by this tool instance
+    credits_used = 0
+
+    # local store where fetched contents are indexed (see LocalSearchTool)
+    knowledge_store: KnowledgeStore | None = None
+
+    # budget governor deciding the depth of calls, and the session they are accounted to
+    governor: BudgetGovernor | None = None
+    session_id: str = "default"
+
+    def attach_governor(self, governor: BudgetGovernor, session_id: str):
+        """
+        Have the calls of this tool governed and accounted to the given session.
+        """
+        self.governor = governor
+        self.session_id = session_id
+
+    def _authorize(self, kind: str, query: str | None, advanced_requested: bool) -> str:
+        """
+        Return the depth a call must use, raising BudgetExceeded if the governor refuses it.
+        """
+        if self.governor is None:
+            return "advanced" if advanced_requested else "basic"
+        return self.governor.authorize(self.session_id, kind, query, advanced_requested)
+
+    def _spend_credits(self, credits: int, reserved: int):
+        """
+        Account for the Tavily credits consumed by a call, settling the credits reserved when it was authorized.
+        """
+        self.credits_used += credits
+        if self.governor is not None:
+            self.governor.record(self.session_id, credits, reserved)
+
+    def _call_tavily(self, endpoint_name: str, cache_key, fn, credits_per_request: int, **kwargs):
+        """
+        Call the Tavily API through the resilience layer of the given endpoint and return (response, requests_sent).
+        The call is hedged (while the budget allows a duplicate request), fails fast when the endpoint is down,
+        and falls back on the last response to the same call if cached (no request sent then).
+        """
+        hedge = self.governor is None or self.governor.allows_hedge(self.session_id, credits_per_request)
+        return get_endpoint(endpoint_name).call_with_fallback(cache_key, fn, hedge=hedge, **kwargs)
+
+    def _degraded_response(self, query: str | None = None, url: str | None = None) -> dict | None:
+        """
+        Build a degraded response from the knowledge store when Tavily is unavailable, or None if nothing is found.
+        """
+        if self.knowledge_store is None:
+            return None
+        if url is not None:
+            document = self.knowledge_store.get(url)
+            results = [{"url": document["url"], "raw_content": document["content"]}] if document is not None else []
+        else:
+            results = self.knowledge_store.search(query)
+        if not results:
+            return None
+        return {
+            "results": results,
+            "warning": "Tavily is unavailable: these results come from previously fetched pages and may be outdated.",
+        }
+
+    def _ingest_results(self, response, content_key: str, source: str):
+        """
+        Index the results of a Tavily response in the knowledge store, if any (non-blocking).
+        """
+        if self.knowledge_store is None or not isinstance(response, dict):
+            return
+        for result in response.get("results", []):
+            self.knowledge_store.ingest(
+                url=result.get("url"),
+                title=result.get("title"),
+                content=result.get(content_key),
+                source=source,
+            )
+
     @staticmethod
     def get_usage() -> str:
         url = "https://api.tavily.com/usage"
@@ -37,10 +117,15 @@ class TavilyBaseClient:
             "Authorization": f"Bearer {TavilyBaseClient.__api_key}",
             "Content-Type": "application/json",
         }
-        res = requests.get(url, headers=headers)
-        res.raise_for_status()
-        
-        account = res.json().get("account", {})
+        def fetch_usage():
+            res = requests.get(url, headers=headers, timeout=10)
+            res.raise_for_status()
+            return res.json()
+
+        # usage is only informative, fall back on the last known one if the API is unavailable
+        usage, _ = get_endpoint("tavily_usage", timeout=10).call_with_fallback("usage", fetch_usage)
+
+        account = usage.get("account", {})
         plan_usage = account.get("plan_usage")
         plan_limit = account.get("plan_limit")
 
@@ -81,38 +166,47 @@ class TavilySearchTool(TavilyBaseClient, Tool):
             "include_raw_content": False,
         }
 
-    def __init__(self):
+    def __init__(self, knowledge_store: KnowledgeStore | None = None):
         """
         Construct the TavilySearchTool.
         """
         # Call superclass constructor
         super().__init__()
 
+        self.knowledge_store = knowledge_store
 
-        self.params = TavilySearchTool.__basic_params
+        self.advanced_mode = False
 
     def enable_advanced_mode(self, enable: bool = True):
         """
         Enable or disable advanced mode for the search tool.
         Advanced mode uses more credits but yields better results.
+        When governed, advanced mode is only a request: the governor picks the depth of each call.
         """
-        if enable:
-            self.params = TavilySearchTool.__advanced_params
-        else:
-            self.params = TavilySearchTool.__basic_params
-        
+        self.advanced_mode = enable
+
         print(f"TavilySearchTool advanced mode has been {'enabled' if enable else 'disabled'}.")
 
     def forward(self, query: str):
 
-        params = self.params
+        try:
+            depth = self._authorize("search", query, self.advanced_mode)
+        except BudgetExceeded as e:
+            return f"Error calling Tavily API: {e}"
+
+        params = dict(TavilySearchTool.__advanced_params if depth == "advanced" else TavilySearchTool.__basic_params)
         params["query"] = query
+        credits = 2 if depth == "advanced" else 1
 
         try:
-            response = self._tavily_client.search(**params)
+            response, requests_sent = self._call_tavily(
+                "tavily_search", ("search", depth, query), self._tavily_client.search, credits, **params)
         except Exception as e:
-            return f"Error calling Tavily API: {e}"
-        
+            self._spend_credits(0, credits)
+            return self._degraded_response(query=query) or f"Error calling Tavily API: {e}"
+
+        self._spend_credits(credits * requests_sent, credits)
+        self._ingest_results(response, "content", "search")
         return response
 
 class TavilyExtractTool(TavilyBaseClient, Tool):
@@ -129,19 +223,33 @@ class TavilyExtractTool(TavilyBaseClient, Tool):
     }
     output_type = "string"
 
-    def __init__(self):
+    def __init__(
+        self,
+        knowledge_store: KnowledgeStore | None = None,
+        condenser: Condenser | None = None,
+        max_page_age: float = 24 * 3600.0,
+    ):
         """
         Construct the TavilyExtractTool.
+        Large pages are condensed for the current task by the given condenser, if any.
+        Pages extracted less than max_page_age seconds ago are served from the knowledge store, without spending credits.
         """
         # Call superclass constructor
         super().__init__()
 
+        self.knowledge_store = knowledge_store
+        self.condenser = condenser
+        self.max_page_age = max_page_age
+        # task of the current run, guiding the condensation
+        self.task = ""
+
         self.extract_depth = "basic"
 
     def enable_advanced_mode(self, enable: bool = True):
         """
         Enable or disable advanced mode for the extract tool.
         Advanced mode uses more credits but yields better results (retrieves more data, including tables and embedded content).
+        When governed, advanced mode is only a request: the governor picks the depth of each call.
         """
         if enable:
             self.extract_depth = "advanced"
@@ -150,17 +258,82 @@ class TavilyExtractTool(TavilyBaseClient, Tool):
 
         print(f"TavilyExtractTool advanced mode has been {'enabled' if enable else 'disabled'}.")
 
+    def set_task(self, task: str):
+        """
+        Set the task of the current run, large pages are condensed for it.
+        """
+        self.task = task
+
     def forward(self, url: str):
+        cached = self._fresh_response(url)
+        if cached is not None:
+            return self._condense_results(cached)
+
+        try:
+            depth = self._authorize("extract", None, self.extract_depth == "advanced")
+        except BudgetExceeded as e:
+            return f"Error calling Tavily extract API: {e}"
+
+        credits = 2 if depth == "advanced" else 1
+
         try:
-            response = self._tavily_client.extract(
+            response, requests_sent = self._call_tavily(
+                "tavily_extract", ("extract", depth, url), self._tavily_client.extract, credits,
                 urls=url,
-                extract_depth=self.extract_depth)
+                extract_depth=depth)
         except Exception as e:
-            return f"Error calling Tavily extract API: {e}"
+            self._spend_credits(0, credits)
+            return self._condense_results(self._degraded_response(url=url)) or f"Error calling Tavily extract API: {e}"
+
+        # Consumes 1 (basic) or 2 (advanced) Tavily credits per 5 successful extractions
+        successes = len(response.get("results", [])) if isinstance(response, dict) else 1
+        self._spend_credits(credits * ((successes + 4) // 5) * requests_sent, credits)
+        self._ingest_results(response, "raw_content", "extract")
 
         # Tavily's Extract API can return raw HTML + text.
         # you may trim or sanitize here if needed.
-        return response
+        return self._condense_results(response)
+
+    def _fresh_response(self, url: str) -> dict | None:
+        """
+        Build a response from the knowledge store if the page was recently extracted, or None to call Tavily.
+        """
+        if self.knowledge_store is None:
+            return None
+        document = self.knowledge_store.get(url)
+        # search snippets are partial, only full extractions can stand in for a new one
+        if document is None or document["source"] != "extract" or time.time() - document["fetched_at"] > self.max_page_age:
+            return None
+        return {"results": [{"url": document["url"], "title": document["title"], "raw_content": document["content"]}]}
+
+    def _condense_results(self, response):
+        """
+        Replace the large pages of a response with digests focused on the current task (full pages stay indexed).
+        The response is copied, it may be cached as is by the resilience layer.
+        """
+        if self.condenser is None or not isinstance(response, dict):
+            return response
+
+        results = []
+        condensed = False
+        for result in response.get("results", []):
+            content = result.get("raw_content")
+            outcome = self.condenser.condense(content, self.task, result.get("url", "")) if isinstance(content, str) else None
+            if outcome is not None:
+                digest, report = outcome
+                result = {**result, "raw_content": digest, "condensed": report}
+                condensed = True
+            results.append(result)
+        if not condensed:
+            return response
+        return {
+            **response,
+            "results": results,
+            "note": (
+                "Large pages were condensed for the current task: their raw_content is a digest whose "
+                "[chars start-end] markers are the offsets of the source text in the page."
+            ),
+        }
 
 class TavilyImageURLSearchTool(TavilyBaseClient, Tool):
     """
@@ -178,15 +351,23 @@ class TavilyImageURLSearchTool(TavilyBaseClient, Tool):
 
     def forward(self, query: str):
         try:
-            response = self._tavily_client.search(
-                query,
+            self._authorize("search", query, False)
+        except BudgetExceeded as e:
+            return f"Error calling Tavily API: {e}"
+
+        try:
+            response, requests_sent = self._call_tavily(
+                "tavily_search", ("image_search", query), self._tavily_client.search, 1,
+                query=query,
                 include_images=True,
                 include_image_descriptions=True,
                 max_results=5
             )
         except Exception as e:
+            self._spend_credits(0, 1)
             return f"Error calling Tavily API: {e}"
 
+        self._spend_credits(requests_sent, 1)
         images = response.get("images", [])
         if not images:
             return "none"
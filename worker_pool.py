@@ -0,0 +1,423 @@
+# The MIT License
+
+# Copyright (c) 2025 Albert Murienne
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import math
+import multiprocessing
+import os
+import pickle
+import queue
+import resource
+import signal
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+from typing import Callable, Generator
+
+from budget import BudgetGovernor, get_default_governor, set_default_governor
+from condense import get_default_condenser
+from profiling import get_default_run_profiler
+from providers import get_default_provider_manager
+from resilience import get_endpoint_stats
+from sessions import dumps
+from web_tools import TavilyBaseClient
+
+class WorkerError(RuntimeError):
+    """
+    Raised when an agent run fails in its worker process, or when the worker died or exceeded a limit.
+    Holds the memory steps of the session at the time of the failure, when the worker could send them.
+    """
+
+    def __init__(self, message: str, memory_steps: list | None = None):
+        super().__init__(message)
+        self.memory_steps = memory_steps
+
+class _GovernorManager(BaseManager):
+    """
+    Serves the budget governor of the server process to the worker processes, so that budgets stay global.
+    Each pool registers its governor on its own subclass, the registry of a manager class being class-wide.
+    """
+
+def _cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _process_stats() -> dict:
+    """
+    Return the endpoint, provider and condensation stats of the worker process.
+    """
+    condenser = get_default_condenser()
+    return {
+        "endpoints": get_endpoint_stats(),
+        "providers": get_default_provider_manager().stats(),
+        "condensation": condenser.stats if condenser is not None else None,
+    }
+
+def _worker_main(conn, agent_factory: Callable, initializer: Callable | None, governor_address, authkey: bytes,
+                 memory_limit: int | None, cached_agents: int):
+    """
+    Entry point of a worker process: run the jobs received on conn and send their events back.
+    """
+    # leave interruptions to the server process, which terminates its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    _GovernorManager.register("get_governor")
+    manager = _GovernorManager(address=governor_address, authkey=authkey)
+    manager.connect()
+    set_default_governor(manager.get_governor())
+    if initializer is not None:
+        initializer()
+
+    # agents are cached per session, their memory is still shipped with every job
+    agents = OrderedDict()
+    _, cpu_hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+
+    while True:
+        try:
+            job = pickle.loads(conn.recv_bytes())
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        session_id = job["session_id"]
+        agent = agents.pop(session_id, None)
+        if agent is None:
+            agent = agent_factory(session_id)
+        agents[session_id] = agent
+        while len(agents) > cached_agents:
+            agents.popitem(last=False)
+
+        agent.set_memory_steps(job["memory_steps"])
+        agent.enable_advanced_mode(job["advanced_mode"])
+        # profiling is decided by the server process, which also keeps the profiles
+        if job["profile"]:
+            agent.profile_next = True
+        latest_profiles = get_default_run_profiler().recent()[:1]
+        # providers are resolved and ranked by the server process
+        get_default_provider_manager().pin(job["providers"])
+        credits_before = agent.get_spent_credits()
+        if job["cpu_limit"] is not None:
+            # RLIMIT_CPU counts the whole process life, exceeding it kills the worker (SIGXCPU)
+            resource.setrlimit(resource.RLIMIT_CPU, (math.ceil(_cpu_time() + job["cpu_limit"]), cpu_hard_limit))
+
+        try:
+            for event in agent.run(job["task"], additional_args=job["additional_args"]):
+                conn.send_bytes(dumps(("event", event)))
+            kind, message, memory_error = "done", None, False
+        except MemoryError:
+            kind, message, memory_error = "error", "the run exceeded the worker memory limit", True
+        except Exception as e:
+            kind, message, memory_error = "error", str(e), False
+        finally:
+            if job["cpu_limit"] is not None:
+                resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard_limit, cpu_hard_limit))
+
+        profiles = get_default_run_profiler().recent()[:1]
+        conn.send_bytes(dumps((kind, {
+            "message": message,
+            "memory_steps": agent.get_memory_steps(),
+            "credits": agent.get_spent_credits() - credits_before,
+            "memory_error": memory_error,
+            "profile": profiles[0] if profiles != latest_profiles else None,
+            "stats": _process_stats(),
+        })))
+
+class _Worker:
+    """
+    A worker process and the server end of its pipe.
+    """
+
+    def __init__(self, pool: "WorkerPool"):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = pool._context.Process(
+            target=_worker_main,
+            args=(
+                child_conn, pool.agent_factory, pool.initializer, pool._governor_address, pool._authkey,
+                pool.memory_limit, pool.cached_agents,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.deadline = None
+        self.killed_reason = None
+
+    def kill(self, reason: str):
+        self.killed_reason = reason
+        self.process.kill()
+        self.process.join(timeout=5.0)
+
+class WorkerPool:
+    """
+    A pool of worker processes running agents out of the server process, so that model-generated code or
+    CPU-heavy rendering cannot hold the GIL of the server and stall the streaming of the other sessions.
+    Run events are streamed back over pipes. Runs are limited in CPU time, memory and duration, and workers
+    are recycled after a number of runs or when a run breaks a limit.
+    The server process decides which runs are profiled and ranks the inference providers; the workers send
+    back their profiles and stats with the result of each run.
+    """
+
+    def __init__(
+        self,
+        agent_factory: Callable,
+        size: int = 4,
+        time_limit: float | None = 600.0,
+        cpu_limit: float | None = None,
+        memory_limit: int | None = None,
+        max_runs_per_worker: int = 50,
+        cached_agents: int = 8,
+        governor: BudgetGovernor | None = None,
+        initializer: Callable | None = None,
+    ):
+        """
+        Construct the WorkerPool and start its workers.
+
+        Args:
+            agent_factory: Picklable callable building the agent of a session in a worker, given the session id.
+            size: Number of worker processes (i.e. of concurrent runs, further runs wait for a free worker).
+            time_limit: Maximum duration of a run (seconds), its worker is killed beyond.
+            cpu_limit: Maximum CPU time of a run (seconds), its worker is killed beyond.
+            memory_limit: Maximum address space of a worker process (bytes).
+            max_runs_per_worker: Number of runs after which a worker is replaced by a fresh one.
+            cached_agents: Number of session agents each worker keeps between runs.
+            governor: Budget governor enforced in the workers (defaults to the one of this process).
+            initializer: Picklable callable run in each worker at startup, e.g. to configure process-wide defaults.
+        """
+        self.agent_factory = agent_factory
+        self.size = size
+        self.time_limit = time_limit
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.max_runs_per_worker = max_runs_per_worker
+        self.cached_agents = cached_agents
+        self.initializer = initializer
+        # spawned workers do not inherit the threads and locks of the server process
+        self._context = multiprocessing.get_context("spawn")
+
+        self._authkey = os.urandom(32)
+        self.governor = governor = governor or get_default_governor()
+        manager_class = type("_PoolGovernorManager", (_GovernorManager,), {})
+        manager_class.register("get_governor", callable=lambda: governor)
+        self._governor_server = manager_class(address=("127.0.0.1", 0), authkey=self._authkey).get_server()
+        self._governor_address = self._governor_server.address
+        threading.Thread(target=self._governor_server.serve_forever, daemon=True).start()
+
+        self._idle = queue.Queue()
+        self._busy: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.stats = {"runs": 0, "failures": 0, "killed": 0, "recycled": 0}
+        self._worker_stats: dict[int, dict] = {}
+        for _ in range(size):
+            self._idle.put(_Worker(self))
+        threading.Thread(target=self._watchdog_loop, daemon=True).start()
+
+    def run(self, session_id: str, task: str, additional_args: dict | None, memory_steps: list,
+            advanced_mode: bool = False, profile: bool = False) -> Generator[tuple[str, object], None, None]:
+        """
+        Run a task in a free worker and yield ("event", event) for every event of the run, then
+        ("done", result) where result holds the memory steps and the credits spent by the run.
+        Raises WorkerError if the run fails.
+        """
+        worker = self._idle.get()
+        job = {
+            "session_id": session_id,
+            "task": task,
+            "additional_args": additional_args,
+            "memory_steps": memory_steps,
+            "advanced_mode": advanced_mode,
+            "profile": profile,
+            "cpu_limit": self.cpu_limit,
+            "providers": get_default_provider_manager().selections(),
+        }
+        finished = False
+        with self._lock:
+            worker.deadline = time.monotonic() + self.time_limit if self.time_limit is not None else None
+            self._busy.add(worker)
+        self.stats["runs"] += 1
+        try:
+            worker.conn.send_bytes(dumps(job))
+            while True:
+                try:
+                    kind, payload = pickle.loads(worker.conn.recv_bytes())
+                except (EOFError, OSError):
+                    finished = True
+                    raise WorkerError(self._death_reason(worker)) from None
+                if kind == "event":
+                    yield kind, payload
+                    continue
+                finished = True
+                worker.runs += 1
+                self._collect(worker, payload)
+                if kind == "error":
+                    if payload["memory_error"]:
+                        # a MemoryError may have left the worker in a broken state
+                        worker.kill("memory limit exceeded")
+                    raise WorkerError(payload["message"], payload["memory_steps"])
+                yield kind, payload
+                return
+        except Exception:
+            self.stats["failures"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._busy.discard(worker)
+                worker.deadline = None
+            if not finished:
+                # the consumer stopped listening (e.g. closed stream): the run cannot be interrupted cleanly
+                worker.kill("run abandoned")
+            self._release(worker)
+
+    def _collect(self, worker: _Worker, payload: dict):
+        """
+        Keep the stats and the profile a worker sent back with the result of a run.
+        """
+        with self._lock:
+            self._worker_stats[worker.process.pid] = payload.pop("stats")
+        profile = payload.pop("profile")
+        if profile is not None:
+            get_default_run_profiler().add(profile)
+
+    def worker_stats(self) -> dict[int, dict]:
+        """
+        Return the latest endpoint, provider and condensation stats of each live worker, by process id.
+        """
+        with self._lock:
+            return dict(self._worker_stats)
+
+    def _death_reason(self, worker: _Worker) -> str:
+        worker.process.join(timeout=1.0)
+        if worker.killed_reason is not None:
+            return f"the run was stopped: {worker.killed_reason}"
+        if worker.process.exitcode == -signal.SIGXCPU:
+            return f"the run exceeded its CPU time limit ({self.cpu_limit}s)"
+        return f"the worker process died (exit code {worker.process.exitcode})"
+
+    def _release(self, worker: _Worker):
+        """
+        Give a worker back to the pool, or replace it if it died or served enough runs.
+        """
+        if self._closed.is_set():
+            worker.process.kill()
+            return
+        # a killed worker may not be reaped yet and still look alive
+        if worker.killed_reason is not None or not worker.process.is_alive():
+            self.stats["killed"] += 1
+            worker = self._replace(worker)
+        elif worker.runs >= self.max_runs_per_worker:
+            self.stats["recycled"] += 1
+            worker.conn.send_bytes(dumps(None))
+            worker = self._replace(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        with self._lock:
+            self._worker_stats.pop(worker.process.pid, None)
+        return _Worker(self)
+
+    def _watchdog_loop(self):
+        while not self._closed.wait(0.5):
+            now = time.monotonic()
+            with self._lock:
+                expired = [worker for worker in self._busy if worker.deadline is not None and now > worker.deadline]
+            for worker in expired:
+                print(f"Worker {worker.process.pid} killed: run exceeded {self.time_limit}s.")
+                worker.kill(f"time limit exceeded ({self.time_limit}s)")
+
+    def close(self):
+        """
+        Stop all the workers and the governor server.
+        """
+        self._closed.set()
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.process.kill()
+        with self._lock:
+            for worker in self._busy:
+                worker.process.kill()
+        self._governor_server.stop_event.set()
+
+class RemoteAgent:
+    """
+    Stand-in for SmolAlbert in the server process, running every task in a WorkerPool.
+    The agent memory lives here and is shipped to the worker with each run, so any worker can serve any session
+    and sessions are hibernated like local agents.
+    """
+
+    def __init__(self, pool: WorkerPool, session_id: str | None = None):
+        self.pool = pool
+        self.session_id = session_id or "default"
+        self.memory_steps = []
+        self.advanced_mode = False
+        self.profile_next = False
+        self.credits_used = 0
+
+    def run(self, task: str, additional_args: dict | None = None) -> Generator:
+        """
+        Run the task in a worker and yield the events of the run, like SmolAlbert.run.
+        """
+        force_profile, self.profile_next = self.profile_next, False
+        return self._run(task, additional_args, get_default_run_profiler().sampled(force_profile))
+
+    def _run(self, task: str, additional_args: dict | None, profile: bool):
+        try:
+            for kind, payload in self.pool.run(
+                self.session_id, task, additional_args, self.memory_steps, self.advanced_mode, profile
+            ):
+                if kind == "event":
+                    yield payload
+                else:
+                    self.memory_steps = payload["memory_steps"]
+                    self.credits_used += payload["credits"]
+        except WorkerError as e:
+            # keep the steps completed before the failure, like a local agent does
+            if e.memory_steps is not None:
+                self.memory_steps = e.memory_steps
+            raise
+
+    def enable_advanced_mode(self, enable: bool):
+        self.advanced_mode = enable
+
+    def reset(self):
+        self.memory_steps = []
+
+    def get_memory_steps(self) -> list:
+        return list(self.memory_steps)
+
+    def set_memory_steps(self, steps: list):
+        self.memory_steps = list(steps)
+
+    def get_spent_credits(self) -> int:
+        return self.credits_used
+
+    def get_budget_report(self) -> str:
+        return self.pool.governor.report(self.session_id)
+
+    @staticmethod
+    def get_search_credits() -> str:
+        return TavilyBaseClient.get_usage()